@@ -99,6 +99,26 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+# Run more than one process against a shared backend (Redis, Memcached): the store
+# cache version counters also feed the book list ETags.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Cache alias and timeout (seconds) used for cached catalog responses.
+STORE_CACHE_ALIAS = 'default'
+STORE_CACHE_TIMEOUT = int(os.getenv('STORE_CACHE_TIMEOUT', 300))
+
+# Carts without item changes for this long are removed by `manage.py purge_stale_carts`.
+STORE_CART_TTL = timedelta(days=int(os.getenv('STORE_CART_TTL_DAYS', 30)))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -138,6 +158,10 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR,'media')
+# '' streams media through Django, 'x-accel-redirect' (nginx) or 'x-sendfile' hands it to the web server.
+MEDIA_OFFLOAD = os.getenv('MEDIA_OFFLOAD', '')
+MEDIA_OFFLOAD_PREFIX = os.getenv('MEDIA_OFFLOAD_PREFIX', '/protected-media/')
+MEDIA_MAX_AGE = int(os.getenv('MEDIA_MAX_AGE', 3600))
 
 INTERNAL_IPS = [
     # ...
@@ -154,6 +178,10 @@ AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
     'COERCE_DECIMAL_TO_STRING': False,
+    'DEFAULT_RENDERER_CLASSES': (
+        'store.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_AUTHENTICATION_CLASSES': (  
         'rest_framework_simplejwt.authentication.JWTAuthentication',),       
 }
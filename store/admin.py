@@ -3,6 +3,8 @@ from django.contrib import admin, messages
 from django.db.models.query import QuerySet
 from django.http import HttpRequest
 from .models import *
+from . import cache
+from .images import variant_urls
 from django.utils.html import format_html
 from django.utils.http import urlencode
 from django.db.models.aggregates import Count
@@ -18,7 +20,8 @@ class BookImageInline(admin.TabularInline):
 
     def thumbnail(self , instance):
         if instance.image.name != '':
-            return format_html(f'<img src ="{instance.image.url}" class ="thumbnail" />')
+            url = variant_urls(instance.image, instance.variants_ready)['thumbnail']
+            return format_html(f'<img src ="{url}" class ="thumbnail" />')
         return ''
 
 
@@ -45,7 +48,8 @@ class PriceFilter(admin.SimpleListFilter):
 
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
-    list_display = ['title', 'price', 'inventory_status', 'date_time_modified','category']
+    list_display = ['title', 'price', 'effective_price', 'inventory_status', 'date_time_modified','category']
+    readonly_fields = ['effective_price', 'approved_comment_count']
     list_per_page = 10
     list_editable = ['price']
     list_filter = ['category', PriceFilter]
@@ -83,6 +87,7 @@ class CategoryAdmin(admin.ModelAdmin):
     list_display = ['title', 'books_count']
     search_fields = ['title']
     autocomplete_fields = ['featured_book']
+    exclude = ['books_count']
 
     @admin.display(ordering='books_count')
     def books_count(self, category):
@@ -93,9 +98,6 @@ class CategoryAdmin(admin.ModelAdmin):
                 'category__id': str(category.id)
             }))
         return format_html('<a href="{}">{} Books</a>', url, category.books_count)
-    
-    def get_queryset(self, request: HttpRequest) -> QuerySet[Any]:
-        return super().get_queryset(request).annotate(books_count = Count('books'))
                         
 
 @admin.register(Customer)
@@ -130,7 +132,8 @@ class OrderItemInline(admin.TabularInline):
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['customer', 'status']
+    list_display = ['customer', 'status', 'placed_at', 'total_amount', 'item_count']
+    list_filter = ['status']
     autocomplete_fields = ['customer']
     inlines = [OrderItemInline]
 
@@ -145,7 +148,29 @@ class AddressAdmin(admin.ModelAdmin):
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = ['body', 'book', 'status']
+    list_filter = ['status']
     autocomplete_fields = ['book']
+    actions = ['approve_comments', 'reject_comments']
+
+    @admin.action(description='Approve selected comments')
+    def approve_comments(self, request, queryset):
+        updated_count, book_ids = queryset.set_status(Comment.COMMENT_STATUS_APPROVED)
+        cache.invalidate('books', *book_ids)
+        self.message_user(
+            request,
+            f'{updated_count} comments were successfully approved.',
+            messages.SUCCESS
+        )
+
+    @admin.action(description='Reject selected comments')
+    def reject_comments(self, request, queryset):
+        updated_count, book_ids = queryset.set_status(Comment.COMMENT_STATUS_NOT_APPROVED)
+        cache.invalidate('books', *book_ids)
+        self.message_user(
+            request,
+            f'{updated_count} comments were successfully rejected.',
+            messages.SUCCESS
+        )
 
 
 @admin.register(BookImage)
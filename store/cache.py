@@ -0,0 +1,148 @@
+import time
+from hashlib import sha1
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+
+KEY_PREFIX = 'store:response'
+HITS_KEY = f'{KEY_PREFIX}:stats:hits'
+MISSES_KEY = f'{KEY_PREFIX}:stats:misses'
+
+
+def get_cache():
+    return caches[getattr(settings, 'STORE_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'STORE_CACHE_TIMEOUT', 300)
+
+
+# Entries are never deleted. Every key embeds version counters, and invalidating
+# bumps a counter so that older entries are simply never read again and expire.
+# A counter evicted from the cache restarts from the current time, not from zero,
+# so it can not collide with a version that was in use before.
+
+def _namespace_key(namespace):
+    return f'{KEY_PREFIX}:{namespace}:all'
+
+
+def _list_key(namespace):
+    return f'{KEY_PREFIX}:{namespace}:list'
+
+
+def _object_key(namespace, pk):
+    return f'{KEY_PREFIX}:{namespace}:obj:{pk}'
+
+
+def _get_versions(keys):
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, time.time_ns(), timeout=None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key, 0) for key in keys]
+
+
+def _bump(keys):
+    cache = get_cache()
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate(namespace, *pks):
+    """Drop the cached list pages of `namespace` and the detail entries of `pks`."""
+    keys = [_list_key(namespace)] + [_object_key(namespace, pk) for pk in pks if pk is not None]
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def invalidate_all(namespace):
+    keys = [_namespace_key(namespace)]
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def request_digest(request):
+    query = urlencode(sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    ))
+    # The host is part of the key because paginated payloads contain absolute links.
+    raw = f'{request.build_absolute_uri(request.path)}?{query}'
+    return sha1(raw.encode('utf-8')).hexdigest()
+
+
+def list_versions(namespace):
+    """The version counters that change whenever any row listed under `namespace` does."""
+    return _get_versions([_namespace_key(namespace), _list_key(namespace)])
+
+
+def list_cache_key(namespace, request):
+    return '{}:{}:{}:{}:list:{}'.format(KEY_PREFIX, namespace, *list_versions(namespace), request_digest(request))
+
+
+def detail_cache_key(namespace, pk, request):
+    versions = _get_versions([_namespace_key(namespace), _object_key(namespace, pk)])
+    return '{}:{}:{}:{}:detail:{}:{}'.format(KEY_PREFIX, namespace, *versions, pk, request_digest(request))
+
+
+def _count(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def get_stats():
+    counts = get_cache().get_many([HITS_KEY, MISSES_KEY])
+    hits = counts.get(HITS_KEY, 0)
+    misses = counts.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
+
+
+class CachedResponseMixin:
+    """
+    Caches the serialized data of GET list/retrieve responses per query string.
+
+    Entries are keyed under `cache_namespace` and invalidated by the signal
+    handlers in store.signals when the underlying rows change.
+    """
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        key = list_cache_key(self.cache_namespace, request)
+        return self.get_cached_response(key, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        key = detail_cache_key(self.cache_namespace, pk, request)
+        return self.get_cached_response(key, super().retrieve, request, *args, **kwargs)
+
+    def get_cached_response(self, key, view_method, request, *args, **kwargs):
+        cache = get_cache()
+        data = cache.get(key)
+        if data is not None:
+            _count(HITS_KEY)
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        _count(MISSES_KEY)
+        response = view_method(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, get_timeout())
+        response['X-Cache'] = 'MISS'
+        return response
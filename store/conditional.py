@@ -0,0 +1,61 @@
+from hashlib import sha1
+
+from django.core.exceptions import ValidationError
+from django.db.models import Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .cache import list_versions, request_digest
+
+
+class ConditionalGetMixin:
+    """
+    Adds ETag/Last-Modified validators to list and retrieve, answering
+    `304 Not Modified` before anything is serialized.
+
+    Detail validators come from `last_modified_field`, which must be bumped
+    whenever anything rendered for the row changes (related rows included).
+    List ETags combine the newest `last_modified_field` of the whole table, one
+    index lookup that sees writes from every process, with the version counters
+    of `cache_namespace`, which the signal handlers bump on deletions too.
+    """
+    last_modified_field = 'date_time_modified'
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        model = self.get_queryset().model
+        last_modified = model._default_manager.aggregate(last_modified=Max(self.last_modified_field))['last_modified']
+        etag = self.make_etag(request, last_modified, *list_versions(self.cache_namespace))
+        return self.get_conditional_response(request, etag, None, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            last_modified = (
+                self.get_queryset().model.objects.filter(pk=pk)
+                .values_list(self.last_modified_field, flat=True).first()
+            )
+        except (TypeError, ValueError, ValidationError):
+            # Malformed ids get the 404 of get_object().
+            last_modified = None
+        if last_modified is None:
+            return super().retrieve(request, *args, **kwargs)
+        etag = self.make_etag(request, pk, last_modified)
+        return self.get_conditional_response(request, etag, last_modified, super().retrieve, *args, **kwargs)
+
+    def make_etag(self, request, *parts):
+        parts = [request_digest(request), request.accepted_media_type, *parts]
+        raw = ':'.join(part.isoformat() if hasattr(part, 'isoformat') else str(part) for part in parts)
+        return quote_etag(sha1(raw.encode('utf-8')).hexdigest())
+
+    def get_conditional_response(self, request, etag, last_modified, view_method, *args, **kwargs):
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = view_method(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
@@ -0,0 +1,13 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class InsufficientInventory(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Not enough inventory for one or more books.'
+    default_code = 'insufficient_inventory'
+
+    def __init__(self, conflicts):
+        super().__init__()
+        # Kept as plain data so the quantities stay numbers in the response.
+        self.detail = {'error': self.default_detail, 'conflicts': conflicts}
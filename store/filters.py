@@ -1,6 +1,9 @@
 from unicodedata import category
+from django.db.models import Count, Sum
 from django_filters.rest_framework.filterset import FilterSet
-from .models import Book
+from rest_framework.filters import SearchFilter
+from .models import Book, Comment, Order
+from .search import tokenize
 
 
 class BookFilter(FilterSet):
@@ -8,5 +11,46 @@ class BookFilter(FilterSet):
         model = Book
         fields = {'category_id':['exact'],
                   'price':['gt','lt'],
+                  'effective_price':['gt','lt'],
                   'inventory':['gt','lt'],
-                  }
\ No newline at end of file
+                  }
+
+
+class CommentFilter(FilterSet):
+    class Meta:
+        model = Comment
+        fields = {'status':['exact'],
+                  }
+
+
+class OrderFilter(FilterSet):
+    class Meta:
+        model = Order
+        fields = {'status':['exact'],
+                  'customer_id':['exact'],
+                  'placed_at':['gte','lte'],
+                  }
+
+
+class BookSearchFilter(SearchFilter):
+    """
+    Ranked `?search=` backed by the BookSearchTerm inverted index.
+
+    Every query term has to match a whole word of the title or description;
+    results are ordered by the summed term weights unless `?ordering=` is given.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = set()
+        for search_term in self.get_search_terms(request):
+            terms.update(tokenize(search_term))
+        if not terms:
+            return queryset
+
+        return (
+            queryset
+            .filter(search_terms__term__in=terms)
+            .annotate(search_rank=Sum('search_terms__weight'), search_hits=Count('search_terms'))
+            .filter(search_hits=len(terms))
+            .order_by('-search_rank')
+        )
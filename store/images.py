@@ -0,0 +1,143 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image
+
+from . import cache
+
+
+logger = logging.getLogger(__name__)
+
+# Longest edges, the aspect ratio is kept.
+VARIANTS = {
+    'thumbnail': (150, 150),
+    'medium': (600, 600),
+}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        workers = getattr(settings, 'STORE_IMAGE_WORKERS', 2)
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='store-images')
+    return _executor
+
+
+def variant_name(name, variant):
+    # Variants live next to the original: store/images/cover.jpg -> store/images/cover.thumbnail.jpg
+    root, ext = os.path.splitext(name)
+    return f'{root}.{variant}{ext}'
+
+
+def render_variant(original, size, image_format):
+    variant = original.copy()
+    variant.thumbnail(size)
+    if image_format == 'JPEG' and variant.mode not in ('RGB', 'L'):
+        variant = variant.convert('RGB')
+    buffer = BytesIO()
+    variant.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def generate_variants(image_field):
+    """Write every size in VARIANTS next to the stored original."""
+    storage = image_field.storage
+    with storage.open(image_field.name, 'rb') as file:
+        original = Image.open(file)
+        original.load()
+    image_format = original.format or 'PNG'
+    for variant, size in VARIANTS.items():
+        name = variant_name(image_field.name, variant)
+        content = ContentFile(render_variant(original, size, image_format))
+        if hasattr(storage, 'save_derived'):
+            storage.save_derived(name, content)
+        else:
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, content)
+
+
+def lock_blob(name):
+    """Lock the ImageBlob row of a stored name, creating it if needed. Call inside a transaction."""
+    from .models import ImageBlob
+
+    return ImageBlob.objects.select_for_update().get_or_create(name=name)[0]
+
+
+def generate_book_image_variants(image_id):
+    from .models import Book, BookImage
+
+    book_image = BookImage.objects.filter(pk=image_id).first()
+    if book_image is None or not book_image.image:
+        return False
+    name = book_image.image.name
+    with transaction.atomic():
+        # Keeps release_image() from deleting the original while its variants are written.
+        blob = lock_blob(name)
+        if not BookImage.objects.filter(image=name).exists():
+            blob.delete()
+            return False
+        generate_variants(book_image.image)
+    # Variants belong to the stored file, so every row sharing it is ready now.
+    # Rows whose original was replaced in the meantime no longer match the name.
+    images = BookImage.objects.filter(image=name, variants_ready=False)
+    book_ids = list(images.values_list('book_id', flat=True).distinct())
+    images.update(variants_ready=True)
+    if book_ids:
+        Book.objects.filter(pk__in=book_ids).update(date_time_modified=timezone.now())
+        cache.invalidate('books', *book_ids)
+    return True
+
+
+def _run_in_worker(image_id):
+    try:
+        generate_book_image_variants(image_id)
+    except Exception:
+        logger.exception('Could not generate variants for book image %s', image_id)
+    finally:
+        # Worker threads open their own connections, which Django does not close for them.
+        connections.close_all()
+
+
+def schedule_variants(image_id):
+    """Generate the variants in the worker pool once the upload is committed."""
+    transaction.on_commit(lambda: get_executor().submit(_run_in_worker, image_id))
+
+
+def release_image(name):
+    """Delete a stored image and its variants once the last BookImage using it is gone."""
+    if not name:
+        return
+
+    def delete_if_unused():
+        from .models import BookImage
+
+        with transaction.atomic():
+            # Uploads of the same content hold the blob lock until their row is committed,
+            # so once it is ours the rows are the reference count.
+            blob = lock_blob(name)
+            if BookImage.objects.select_for_update().filter(image=name).exists():
+                return
+            storage = BookImage._meta.get_field('image').storage
+            for stored_name in [name, *(variant_name(name, variant) for variant in VARIANTS)]:
+                storage.delete(stored_name)
+            blob.delete()
+
+    transaction.on_commit(delete_if_unused)
+
+
+def variant_urls(image_field, ready):
+    if not image_field:
+        return None
+    if not ready:
+        # Until the worker is done every variant falls back to the original.
+        return {variant: image_field.url for variant in VARIANTS}
+    return {variant: image_field.storage.url(variant_name(image_field.name, variant)) for variant in VARIANTS}
@@ -0,0 +1,56 @@
+import time
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from store.models import Book, Category
+from store.search import index_books
+from store.serializers import insert_books
+
+
+VOCABULARY_SIZE = 5000
+
+
+def word(seed):
+    # A spread-out pseudo vocabulary, so terms are about as selective as in real text.
+    return f'w{(seed * 7919) % VOCABULARY_SIZE}'
+
+
+@contextmanager
+def rolled_back():
+    """Run a benchmark on throwaway rows that are never committed."""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def timed(func, repeat):
+    """Return the best wall time of `repeat` calls, in milliseconds."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def create_books(count, category=None, batch_size=1000):
+    category = category or Category.objects.create(title='Benchmark')
+    books = []
+    for start in range(0, count, batch_size):
+        batch = insert_books([
+            Book(
+                title=' '.join(word(index * 3 + offset) for offset in range(3)),
+                slug=f'benchmark-{index}',
+                description=' '.join(word(index * 40 + offset) for offset in range(40)),
+                price=10 + index % 90,
+                effective_price=10 + index % 90,
+                inventory=100,
+                category=category,
+            )
+            for index in range(start, min(start + batch_size, count))
+        ])
+        index_books(batch)
+        books += batch
+    return books
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum
+
+from store.models import Order, OrderItem
+
+
+class Command(BaseCommand):
+    help = 'Compute Order.total_amount and Order.item_count from order items, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        updated = 0
+        while True:
+            ids = list(
+                Order.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            totals = {
+                row['order_id']: row
+                for row in OrderItem.objects.filter(order_id__in=ids)
+                .values('order_id')
+                .annotate(
+                    total=Sum(F('unit_price') * F('quantity'), output_field=DecimalField(max_digits=10, decimal_places=2)),
+                    count=Sum('quantity'),
+                )
+            }
+            orders = [
+                Order(
+                    id=order_id,
+                    total_amount=totals[order_id]['total'] if order_id in totals else 0,
+                    item_count=totals[order_id]['count'] if order_id in totals else 0,
+                )
+                for order_id in ids
+            ]
+            with transaction.atomic():
+                Order.objects.bulk_update(orders, ['total_amount', 'item_count'])
+            last_id = ids[-1]
+            updated += len(ids)
+            self.stdout.write(f'Updated {updated} orders...')
+        self.stdout.write(self.style.SUCCESS(f'Backfilled totals for {updated} orders.'))
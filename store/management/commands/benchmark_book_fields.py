@@ -0,0 +1,36 @@
+from unittest.mock import patch
+
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIClient
+
+from store.views import BookViewSet
+
+from ._benchmark import create_books, rolled_back, timed
+
+
+def uncached_response(view, key, view_method, request, *args, **kwargs):
+    # Response caching would turn every repeat into a cache hit.
+    return view_method(request, *args, **kwargs)
+
+
+class Command(BaseCommand):
+    help = 'Compare payload size and latency of the book list with and without ?fields=.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1000)
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        client = APIClient()
+        with rolled_back(), patch.object(BookViewSet, 'get_cached_response', uncached_response), \
+                patch.object(BookViewSet.pagination_class, 'page_size', options['page_size']):
+            create_books(options['books'])
+            self.stdout.write(f'Listing {options["page_size"]} of {options["books"]} books per page')
+            for name, query in (('full', {}), ('fields=id,title,price', {'fields': 'id,title,price'})):
+                def get():
+                    return client.get('/store/books/', query, HTTP_HOST='localhost')
+
+                size = len(get().content)
+                elapsed = timed(get, options['repeat'])
+                self.stdout.write(f'{name:<22} {size:>9} bytes  {elapsed:8.1f} ms')
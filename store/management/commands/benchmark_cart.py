@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Prefetch
+from django.test.utils import CaptureQueriesContext
+
+from store.models import Cart, CartItem
+from store.serializers import CartSerializer
+
+from ._benchmark import create_books, rolled_back, timed
+
+
+class Command(BaseCommand):
+    help = 'Time rendering a large cart with SQL totals against totals added up in Python.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            cart = Cart.objects.create()
+            books = create_books(options['items'])
+            CartItem.objects.bulk_create(CartItem(cart=cart, book=book, quantity=1 + book.pk % 5) for book in books)
+            querysets = {
+                'SQL totals': Cart.objects.with_totals().prefetch_related(
+                    Prefetch('items', queryset=CartItem.objects.with_totals())
+                ),
+                'Python totals': Cart.objects.prefetch_related('items__book'),
+            }
+            self.stdout.write(f'Rendering a cart of {len(books)} items')
+            for name, queryset in querysets.items():
+                def render():
+                    return CartSerializer(queryset.get(pk=cart.pk)).data
+
+                with CaptureQueriesContext(connection) as queries:
+                    total = render()['total_price']
+                elapsed = timed(render, options['repeat'])
+                self.stdout.write(f'{name:<14} total {total}  {len(queries):>2} queries  {elapsed:8.1f} ms')
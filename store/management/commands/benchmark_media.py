@@ -0,0 +1,54 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from django.views.static import serve
+
+from store.media import serve_media
+
+from ._benchmark import timed
+
+
+def consume(response):
+    # Worker time includes pushing the body through the WSGI iterator.
+    for chunk in response:
+        pass
+    response.close()
+    return response
+
+
+class Command(BaseCommand):
+    help = 'Compare django.views.static.serve with serve_media, with and without web server offload.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=2 * 1024 * 1024, help='File size in bytes.')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as media_root:
+            path = 'store/images/ab/' + 'ab' * 32 + '.jpg'
+            os.makedirs(os.path.dirname(os.path.join(media_root, path)))
+            with open(os.path.join(media_root, path), 'wb') as file:
+                file.write(os.urandom(options['size']))
+
+            factory = RequestFactory()
+            with override_settings(MEDIA_ROOT=media_root, MEDIA_OFFLOAD=''):
+                serve_media_etag = serve_media(factory.get('/media/'), path)['ETag']
+            requests = {
+                'full': {},
+                'range 64KiB': {'HTTP_RANGE': 'bytes=0-65535'},
+                'revalidate': {'HTTP_IF_NONE_MATCH': serve_media_etag},
+            }
+            views = {
+                'static.serve': ('', lambda request: serve(request, path, document_root=media_root)),
+                'serve_media': ('', lambda request: serve_media(request, path)),
+                'serve_media+offload': ('x-accel-redirect', lambda request: serve_media(request, path)),
+            }
+            self.stdout.write(f'Serving a {options["size"] // 1024} KiB file, worker time per request')
+            for request_name, headers in requests.items():
+                for view_name, (offload, view) in views.items():
+                    with override_settings(MEDIA_ROOT=media_root, MEDIA_OFFLOAD=offload):
+                        status = consume(view(factory.get(f'/media/{path}', **headers))).status_code
+                        elapsed = timed(lambda: consume(view(factory.get(f'/media/{path}', **headers))), options['repeat'])
+                    self.stdout.write(f'{request_name:<12} {view_name:<20} {status}  {elapsed:8.3f} ms')
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from store.filters import BookSearchFilter
+from store.models import Book
+
+from ._benchmark import create_books, rolled_back, timed
+
+
+class SearchView:
+    search_fields = ['title', 'description']
+
+
+class Command(BaseCommand):
+    help = 'Compare BookSearchFilter with the LIKE based SearchFilter on throwaway books.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--query', help='Defaults to the first two title words of a generated book.')
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            books = create_books(options['books'])
+            query = options['query'] or ' '.join(books[len(books) // 2].title.split()[:2])
+            request = Request(APIRequestFactory().get('/store/books/', {'search': query}))
+            self.stdout.write(f'Searching {len(books)} books for {query!r}')
+            for name, backend in (('SearchFilter', SearchFilter()), ('BookSearchFilter', BookSearchFilter())):
+                def first_page():
+                    queryset = backend.filter_queryset(request, Book.objects.all(), SearchView())
+                    return queryset.count(), list(queryset[:10])
+
+                matches = first_page()[0]
+                elapsed = timed(first_page, options['repeat'])
+                self.stdout.write(f'{name:<18} {matches:>7} matches  {elapsed:8.1f} ms per page')
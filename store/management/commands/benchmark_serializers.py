@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from store.fast_serializers import FastSerializer
+from store.models import Book
+from store.serializers import BookSerializer, SimpleBookSerializer
+
+from ._benchmark import create_books, rolled_back, timed
+
+
+class Command(BaseCommand):
+    help = 'Compare DRF serializers with the compiled FastSerializer read path on throwaway books.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            create_books(options['books'])
+            books = list(Book.objects.select_related('category').prefetch_related('images'))
+            request = Request(APIRequestFactory().get('/store/books/'))
+            self.stdout.write(f'Serializing {len(books)} books')
+            for serializer_class in (BookSerializer, SimpleBookSerializer):
+                def drf():
+                    return serializer_class(books, many=True, context={'request': request}).data
+
+                def fast():
+                    return FastSerializer(serializer_class(books, many=True, context={'request': request})).data
+
+                drf_ms = timed(drf, options['repeat'])
+                fast_ms = timed(fast, options['repeat'])
+                self.stdout.write(
+                    f'{serializer_class.__name__:<22} DRF {drf_ms:8.1f} ms  fast {fast_ms:8.1f} ms  '
+                    f'({drf_ms / fast_ms:.1f}x)'
+                )
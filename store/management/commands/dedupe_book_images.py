@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from store import cache
+from store.images import release_image
+from store.models import Book, BookImage
+from store.storage import is_hashed_name
+
+
+class Command(BaseCommand):
+    help = 'Move book images uploaded before content-hash storage to their hashed names.'
+
+    def handle(self, *args, **options):
+        storage = BookImage._meta.get_field('image').storage
+        names = (
+            BookImage.objects.exclude(image='').exclude(image__isnull=True)
+            .order_by().values_list('image', flat=True).distinct()
+        )
+        moved = missing = 0
+        for name in list(names):
+            if is_hashed_name(name):
+                continue
+            if not storage.exists(name):
+                missing += 1
+                self.stderr.write(f'Missing file: {name}')
+                continue
+            with transaction.atomic(), storage.open(name, 'rb') as file:
+                hashed = storage.save(name, file)
+                images = BookImage.objects.filter(image=name)
+                book_ids = list(images.values_list('book_id', flat=True).distinct())
+                images.update(image=hashed, variants_ready=False)
+                # The image URLs of these books changed.
+                Book.objects.filter(pk__in=book_ids).update(date_time_modified=timezone.now())
+                cache.invalidate('books', *book_ids)
+                release_image(name)
+            moved += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {moved} files to content-hash names ({missing} missing). '
+            'Run generate_image_variants to render their variants.'
+        ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from store.images import generate_book_image_variants
+from store.models import BookImage
+
+
+class Command(BaseCommand):
+    help = 'Generate the resized variants of book images that do not have them yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerate the variants of every image.')
+
+    def handle(self, *args, **options):
+        images = BookImage.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            images = images.filter(variants_ready=False)
+        generated = failed = 0
+        for image_id in images.values_list('id', flat=True).iterator():
+            try:
+                if generate_book_image_variants(image_id):
+                    generated += 1
+            except (OSError, ValueError) as exc:
+                failed += 1
+                self.stderr.write(f'Image {image_id}: {exc}')
+        self.stdout.write(self.style.SUCCESS(f'Generated variants for {generated} images ({failed} failed).'))
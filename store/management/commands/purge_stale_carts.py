@@ -0,0 +1,46 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from store.models import Cart
+
+
+class Command(BaseCommand):
+    help = 'Delete carts whose last activity is older than STORE_CART_TTL, in bounded batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl-days', type=float, help='Override STORE_CART_TTL.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Expired carts selected per scan.')
+        parser.add_argument('--chunk-size', type=int, default=100, help='Carts deleted per transaction.')
+        parser.add_argument('--sleep', type=float, default=0, help='Seconds to pause between chunks.')
+
+    def handle(self, *args, **options):
+        if options['ttl_days'] is not None:
+            ttl = timedelta(days=options['ttl_days'])
+        else:
+            ttl = settings.STORE_CART_TTL
+        cutoff = timezone.now() - ttl
+        batch_size = options['batch_size']
+        chunk_size = options['chunk_size']
+
+        expired = Cart.objects.filter(last_activity__lt=cutoff)
+        purged = 0
+        while True:
+            cart_ids = list(expired.order_by('last_activity').values_list('pk', flat=True)[:batch_size])
+            if not cart_ids:
+                break
+            for start in range(0, len(cart_ids), chunk_size):
+                # Small transactions keep row locks on the cart tables short. The cutoff is
+                # checked again in case a cart was used since it was selected.
+                with transaction.atomic():
+                    deleted, per_model = expired.filter(pk__in=cart_ids[start:start + chunk_size]).delete()
+                purged += per_model.get(Cart._meta.label, 0)
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+            if len(cart_ids) < batch_size:
+                break
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} carts inactive since {cutoff:%Y-%m-%d %H:%M}.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from store import cache
+from store.models import Book, Category
+
+
+class Command(BaseCommand):
+    help = 'Recompute Category.books_count from the book table.'
+
+    def handle(self, *args, **options):
+        counts = (
+            Book.objects.filter(category=OuterRef('pk'))
+            .order_by().values('category')
+            .annotate(count=Count('id')).values('count')
+        )
+        updated = Category.objects.update(books_count=Coalesce(Subquery(counts), 0))
+        # Cached category responses carry the old counts.
+        cache.invalidate_all('categories')
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt book counts for {updated} categories.'))
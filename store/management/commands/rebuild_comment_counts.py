@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from store import cache
+from store.models import Book, Comment
+
+
+class Command(BaseCommand):
+    help = 'Recompute Book.approved_comment_count from the comment table.'
+
+    def handle(self, *args, **options):
+        counts = (
+            Comment.objects.filter(book=OuterRef('pk'), status=Comment.COMMENT_STATUS_APPROVED)
+            .order_by().values('book')
+            .annotate(count=Count('id')).values('count')
+        )
+        with transaction.atomic():
+            # Only books whose counter drifted are rewritten, touched and invalidated.
+            drifted = (
+                Book.objects.select_for_update()
+                .annotate(actual=Coalesce(Subquery(counts), 0))
+                .exclude(approved_comment_count=F('actual'))
+            )
+            book_ids = list(drifted.values_list('pk', flat=True))
+            Book.objects.filter(pk__in=book_ids).update(
+                approved_comment_count=Coalesce(Subquery(counts), 0),
+                date_time_modified=timezone.now(),
+            )
+            cache.invalidate('books', *book_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt comment counts for {len(book_ids)} books.'))
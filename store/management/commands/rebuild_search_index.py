@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store import cache
+from store.models import Book
+from store.search import index_books
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the book search index from book titles and descriptions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        books = Book.objects.only('id', 'title', 'description').order_by('id')
+        last_id = 0
+        indexed = 0
+        while True:
+            batch = list(books.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                index_books(batch)
+            last_id = batch[-1].id
+            indexed += len(batch)
+        # Cached search results were ranked with the old terms.
+        cache.invalidate_all('books')
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} books.'))
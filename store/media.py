@@ -0,0 +1,161 @@
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+
+from .storage import HASHED_NAME_RE
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def get_etag(path, stats):
+    match = HASHED_NAME_RE.search(path)
+    if match:
+        # The content hash is already in the name.
+        return quote_etag(os.path.splitext(os.path.basename(path))[0])
+    return quote_etag(f'{stats.st_size:x}-{stats.st_mtime_ns:x}')
+
+
+def get_cache_control(path):
+    if HASHED_NAME_RE.search(path):
+        return IMMUTABLE_CACHE_CONTROL
+    return f'public, max-age={getattr(settings, "MEDIA_MAX_AGE", 3600)}'
+
+
+def parse_range(header, size):
+    """
+    Return the `(start, end)` byte positions (inclusive) asked for by `header`,
+    None to serve the whole file, or False when the range can not be satisfied.
+    Only single ranges are honoured; anything else gets the full file.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def range_applies(request, etag, last_modified):
+    # A stale If-Range means the client's partial copy is useless: send everything.
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def iter_range(path, start, end):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def offload_response(path, full_path, content_type):
+    """
+    Hand the transfer to the web server in front of Django (`MEDIA_OFFLOAD`):
+    `x-accel-redirect` for nginx, where `MEDIA_OFFLOAD_PREFIX` is an internal
+    location aliased to MEDIA_ROOT, or `x-sendfile` for Apache/lighttpd.
+    The server handles Range requests itself.
+    """
+    mode = getattr(settings, 'MEDIA_OFFLOAD', '')
+    if not mode:
+        return None
+    response = HttpResponse(content_type=content_type)
+    if mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'MEDIA_OFFLOAD_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(path)
+    elif mode == 'x-sendfile':
+        response['X-Sendfile'] = full_path
+    else:
+        raise ValueError(f'Unknown MEDIA_OFFLOAD mode {mode!r}.')
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serve a file from MEDIA_ROOT with validators, long-lived caching for
+    content-hashed names and Range support, or offload it to the web server.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('File not found.')
+    try:
+        stats = os.stat(full_path)
+    except OSError:
+        raise Http404('File not found.')
+    if not stat.S_ISREG(stats.st_mode):
+        raise Http404('File not found.')
+
+    size = stats.st_size
+    last_modified = int(stats.st_mtime)
+    etag = get_etag(path, stats)
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = offload_response(path, full_path, content_type)
+    if response is None:
+        response = stream_response(request, full_path, size, etag, last_modified, content_type)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = get_cache_control(path)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def stream_response(request, full_path, size, etag, last_modified, content_type):
+    byte_range = None
+    header = request.META.get('HTTP_RANGE')
+    if header and range_applies(request, etag, last_modified):
+        byte_range = parse_range(header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = size
+        return response
+
+    if byte_range is None:
+        # FileResponse lets the WSGI server use its file wrapper (sendfile) when it has one.
+        return FileResponse(open(full_path, 'rb'), content_type=content_type)
+
+    start, end = byte_range
+    response = StreamingHttpResponse(iter_range(full_path, start, end), status=206, content_type=content_type)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = end - start + 1
+    return response
@@ -0,0 +1,54 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:35
+
+import re
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# A frozen copy of the tokenizer in store.search as of this migration.
+TOKEN_RE = re.compile(r'\w+')
+FIELD_WEIGHTS = {'title': 3, 'description': 1}
+
+
+def build_terms(book):
+    weights = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        for token in TOKEN_RE.findall((getattr(book, field) or '').lower()):
+            if len(token) >= 2:
+                weights[token[:64]] += weight
+    return weights
+
+
+def index_existing_books(apps, schema_editor):
+    Book = apps.get_model('store', 'Book')
+    BookSearchTerm = apps.get_model('store', 'BookSearchTerm')
+    for book in Book.objects.only('id', 'title', 'description').iterator(chunk_size=500):
+        BookSearchTerm.objects.bulk_create([
+            BookSearchTerm(book_id=book.id, term=term, weight=weight)
+            for term, weight in build_terms(book).items()
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_alter_bookimage_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveIntegerField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='store.book')),
+            ],
+            options={
+                'unique_together': {('term', 'book')},
+            },
+        ),
+        migrations.RunPython(index_existing_books, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:36
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_books(apps, schema_editor):
+    Book = apps.get_model('store', 'Book')
+    Category = apps.get_model('store', 'Category')
+    counts = (
+        Book.objects.filter(category=OuterRef('pk'))
+        .order_by().values('category')
+        .annotate(count=Count('id')).values('count')
+    )
+    Category.objects.update(books_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_book_search_term'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='books_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_books, migrations.RunPython.noop),
+    ]
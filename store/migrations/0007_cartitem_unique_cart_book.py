@@ -0,0 +1,33 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:39
+
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_items(apps, schema_editor):
+    CartItem = apps.get_model('store', 'CartItem')
+    duplicates = (
+        CartItem.objects.values('cart_id', 'book_id')
+        .annotate(rows=Count('id'), first_id=Min('id'), total=Sum('quantity'))
+        .filter(rows__gt=1)
+    )
+    for duplicate in duplicates:
+        CartItem.objects.filter(pk=duplicate['first_id']).update(quantity=duplicate['total'])
+        CartItem.objects.filter(
+            cart_id=duplicate['cart_id'], book_id=duplicate['book_id'],
+        ).exclude(pk=duplicate['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_category_books_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_items, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='cartitem',
+            unique_together={('cart', 'book')},
+        ),
+    ]
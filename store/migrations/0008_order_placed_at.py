@@ -0,0 +1,41 @@
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def set_placed_at(apps, schema_editor):
+    # Orders placed before this migration take the time their first item was created.
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    first_item = (
+        OrderItem.objects.filter(order=OuterRef('pk'))
+        .order_by().values('order')
+        .annotate(created=Min('date_time_created')).values('created')
+    )
+    Order.objects.update(placed_at=Coalesce(Subquery(first_item), 'placed_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_cartitem_unique_cart_book'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='placed_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(set_placed_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'placed_at'], name='order_status_placed_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'placed_at'], name='order_customer_placed_at_idx'),
+        ),
+    ]
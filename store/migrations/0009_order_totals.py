@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_order_placed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+    ]
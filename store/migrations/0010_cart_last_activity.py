@@ -0,0 +1,26 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:41
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_created_at(apps, schema_editor):
+    Cart = apps.get_model('store', 'Cart')
+    Cart.objects.update(last_activity=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_order_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='last_activity',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+    ]
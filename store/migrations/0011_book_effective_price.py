@@ -0,0 +1,39 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:42
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def discounted_price(price, discount_amount):
+    # A frozen copy of store.models.discounted_price as of this migration.
+    if not discount_amount:
+        return price
+    percent = min(max(Decimal(str(discount_amount)), Decimal(0)), Decimal(100))
+    return (price * (100 - percent) / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def compute_effective_prices(apps, schema_editor):
+    Book = apps.get_model('store', 'Book')
+    books = []
+    for book in Book.objects.annotate(best_discount=Max('discount__amount')).only('id', 'price'):
+        book.effective_price = discounted_price(book.price, book.best_discount)
+        books.append(book)
+    Book.objects.bulk_update(books, ['effective_price'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_cart_last_activity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='effective_price',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=6),
+        ),
+        migrations.RunPython(compute_effective_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_book_effective_price'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['category', 'price'], name='book_category_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['category', 'effective_price'], name='book_category_eff_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['category', 'date_time_modified'], name='book_category_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['price'], name='book_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['date_time_modified'], name='book_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['inventory'], name='book_inventory_idx'),
+        ),
+    ]
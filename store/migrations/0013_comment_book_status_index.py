@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_book_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['book', 'status', 'date_was_sent'], name='comment_book_status_sent_idx'),
+        ),
+    ]
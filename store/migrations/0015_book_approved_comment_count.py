@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:44
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_approved_comments(apps, schema_editor):
+    Book = apps.get_model('store', 'Book')
+    Comment = apps.get_model('store', 'Comment')
+    counts = (
+        Comment.objects.filter(book=OuterRef('pk'), status='A')
+        .order_by().values('book')
+        .annotate(count=Count('id')).values('count')
+    )
+    Book.objects.update(approved_comment_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_comment_status_sent_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='approved_comment_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(count_approved_comments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_book_approved_comment_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookimage',
+            name='variants_ready',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:47
+
+import store.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_bookimage_variants_ready'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bookimage',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=store.storage.book_image_storage, upload_to='store/images'),
+        ),
+    ]
@@ -1,13 +1,20 @@
+from collections import Counter
+from decimal import ROUND_HALF_UP, Decimal
 from uuid import uuid4
-from django.db import models
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import Case, ExpressionWrapper, F, Max, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
 from django.contrib import admin
+from .storage import book_image_storage
 
 
 
 class Category(models.Model):
     title = models.CharField(max_length=225)
     featured_book = models.ForeignKey('Book', on_delete=models.SET_NULL, related_name='+', null=True, blank=True)
+    books_count = models.PositiveIntegerField(default=0)
 
     def __str__(self) -> str:
         return self.title
@@ -20,24 +27,83 @@ class Discount(models.Model):
         return str(self.amount)
 
 
+def discounted_price(price, discount_amount):
+    # Discount.amount is a percentage off the list price.
+    if not discount_amount:
+        return price
+    percent = min(max(Decimal(str(discount_amount)), Decimal(0)), Decimal(100))
+    return (price * (100 - percent) / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+class BookQuerySet(models.QuerySet):
+    def refresh_effective_prices(self):
+        """
+        Recompute effective_price from the best linked discount for every book
+        in the queryset and return the ids of the books whose price changed.
+        """
+        books = self.annotate(best_discount=Max('discount__amount')).only('id', 'price', 'effective_price')
+        now = timezone.now()
+        changed = []
+        for book in books:
+            effective_price = discounted_price(book.price, book.best_discount)
+            if effective_price != book.effective_price:
+                book.effective_price = effective_price
+                book.date_time_modified = now
+                changed.append(book)
+        self.model.objects.bulk_update(changed, ['effective_price', 'date_time_modified'], batch_size=500)
+        return [book.pk for book in changed]
+
+
 class Book(models.Model):
     title = models.CharField(max_length=225)
     slug = models.SlugField()
     description = models.TextField()
     price = models.DecimalField(max_digits=6,decimal_places=2)
+    effective_price = models.DecimalField(max_digits=6, decimal_places=2, default=0, db_index=True)
+    approved_comment_count = models.PositiveIntegerField(default=0, db_index=True)
     inventory = models.PositiveIntegerField()
     category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name='books')
     discount = models.ManyToManyField(Discount, blank=True, related_name='books')
     date_time_created = models.DateTimeField(auto_now_add=True)
     date_time_modified = models.DateTimeField(auto_now=True)
 
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        # Shaped after BookFilter and the OrderingFilter fields: an equality on
+        # category followed by a range or sort column, plus the unfiltered sorts.
+        indexes = [
+            models.Index(fields=['category', 'price'], name='book_category_price_idx'),
+            models.Index(fields=['category', 'effective_price'], name='book_category_eff_price_idx'),
+            models.Index(fields=['category', 'date_time_modified'], name='book_category_modified_idx'),
+            models.Index(fields=['price'], name='book_price_idx'),
+            models.Index(fields=['date_time_modified'], name='book_modified_idx'),
+            models.Index(fields=['inventory'], name='book_inventory_idx'),
+        ]
+
     def __str__(self) -> str:
         return self.title
 
 
+class BookSearchTerm(models.Model):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=64)
+    weight = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = [['term', 'book']]
+
+
+class ImageBlob(models.Model):
+    # One row per stored image file. Uploads sharing the file and release_image() lock it,
+    # so the file can not be deleted between an upload finding it and its row being saved.
+    name = models.CharField(max_length=255, unique=True)
+
+
 class BookImage(models.Model):
-    image = models.ImageField(upload_to='store/images', null=True, blank=True)    
+    image = models.ImageField(upload_to='store/images', storage=book_image_storage, null=True, blank=True, db_index=True)
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='images')
+    variants_ready = models.BooleanField(default=False, editable=False)
 
 
 class Customer(models.Model):
@@ -65,9 +131,96 @@ class Address(models.Model):
     detail = models.TextField()
 
 
+PRICE_TOTAL_FIELD = models.DecimalField(max_digits=12, decimal_places=2)
+
+
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        total = Sum(F('items__book__effective_price') * F('items__quantity'), output_field=PRICE_TOTAL_FIELD)
+        return self.annotate(annotated_total_price=Coalesce(total, Value(0), output_field=PRICE_TOTAL_FIELD))
+
+    def touch(self):
+        return self.update(last_activity=timezone.now())
+
+
 class Cart(models.Model):
     cart_id = models.UUIDField(primary_key=True, default=uuid4)
     created_at = models.DateTimeField(auto_now_add=True)
+    last_activity = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = CartQuerySet.as_manager()
+
+    @property
+    def total_price(self):
+        # with_totals() sums the items in SQL; carts loaded without it add them up here.
+        if hasattr(self, 'annotated_total_price'):
+            return self.annotated_total_price
+        return sum(item.total_price for item in self.items.all())
+
+
+class CartItemQuerySet(models.QuerySet):
+    def with_totals(self):
+        # Loads only the book columns the cart serializers render.
+        return (
+            self.select_related('book')
+            .only('id', 'cart', 'quantity', 'book__id', 'book__title', 'book__price', 'book__effective_price')
+            .annotate(annotated_total_price=ExpressionWrapper(F('book__effective_price') * F('quantity'), output_field=PRICE_TOTAL_FIELD))
+        )
+
+
+class CartItemManager(models.Manager.from_queryset(CartItemQuerySet)):
+    def add_quantities(self, cart_id, quantities):
+        """
+        Add `quantities` ({book_id: quantity}) to the cart, creating missing
+        items and incrementing existing ones with a single INSERT ... upsert.
+        """
+        if not quantities:
+            return
+        connection = connections[self.db]
+        upsert_sql = self._upsert_suffix(connection)
+        if upsert_sql is None:
+            return self._add_quantities_fallback(cart_id, quantities)
+
+        opts = self.model._meta
+        qn = connection.ops.quote_name
+        cart_field = opts.get_field('cart')
+        cart_value = cart_field.get_db_prep_value(cart_id, connection)
+        columns = [qn(opts.get_field(name).column) for name in ('cart', 'book', 'quantity')]
+        values = ', '.join(['(%s, %s, %s)'] * len(quantities))
+        params = []
+        for book_id, quantity in quantities.items():
+            params += [cart_value, book_id, quantity]
+
+        sql = f'INSERT INTO {qn(opts.db_table)} ({", ".join(columns)}) VALUES {values} {upsert_sql}'
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def _upsert_suffix(self, connection):
+        opts = self.model._meta
+        qn = connection.ops.quote_name
+        table = qn(opts.db_table)
+        quantity = qn(opts.get_field('quantity').column)
+        if connection.vendor == 'mysql':
+            if not connection.mysql_is_mariadb and connection.mysql_version >= (8, 0, 19):
+                return f'AS new ON DUPLICATE KEY UPDATE {quantity} = {quantity} + new.{quantity}'
+            return f'ON DUPLICATE KEY UPDATE {quantity} = {quantity} + VALUES({quantity})'
+        if connection.vendor in ('postgresql', 'sqlite'):
+            conflict = ', '.join(qn(opts.get_field(name).column) for name in ('cart', 'book'))
+            return f'ON CONFLICT ({conflict}) DO UPDATE SET {quantity} = {table}.{quantity} + EXCLUDED.{quantity}'
+        return None
+
+    def _add_quantities_fallback(self, cart_id, quantities):
+        for book_id, quantity in quantities.items():
+            items = self.filter(cart_id=cart_id, book_id=book_id)
+            if items.update(quantity=F('quantity') + quantity):
+                continue
+            try:
+                with transaction.atomic(using=self.db):
+                    self.create(cart_id=cart_id, book_id=book_id, quantity=quantity)
+            except IntegrityError:
+                # Lost the race against a concurrent insert of the same item.
+                if not items.update(quantity=F('quantity') + quantity):
+                    raise
 
 
 class CartItem(models.Model):
@@ -75,6 +228,17 @@ class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
     quantity = models.SmallIntegerField()
 
+    objects = CartItemManager()
+
+    class Meta:
+        unique_together = [['cart', 'book']]
+
+    @property
+    def total_price(self):
+        if hasattr(self, 'annotated_total_price'):
+            return self.annotated_total_price
+        return self.book.effective_price * self.quantity
+
 
 class Order(models.Model):
     ORDER_STATUS_PENDING = 'P'
@@ -88,6 +252,15 @@ class Order(models.Model):
     ]
     status = models.CharField(max_length=1, choices=ORDER_STATUS, default=ORDER_STATUS_PENDING)
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT, related_name='orders')
+    placed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'placed_at'], name='order_status_placed_at_idx'),
+            models.Index(fields=['customer', 'placed_at'], name='order_customer_placed_at_idx'),
+        ]
 
 class OrderItem(models.Model):
     book = models.ForeignKey(Book, on_delete=models.PROTECT, related_name='items_ordered')
@@ -101,6 +274,39 @@ class OrderItem(models.Model):
 
 
 
+class CommentQuerySet(models.QuerySet):
+    def set_status(self, status):
+        """
+        Moderate every comment in the queryset with one UPDATE and adjust the
+        approved counters of the affected books. Returns the number of comments
+        changed and the ids of the books whose counters moved.
+        """
+        with transaction.atomic(using=self.db):
+            changed = list(self.select_for_update().exclude(status=status).values_list('id', 'book_id', 'status'))
+            if not changed:
+                return 0, []
+            updated = self.model.objects.filter(pk__in=[comment_id for comment_id, book_id, old_status in changed]).update(
+                status=status,
+                date_was_placed=timezone.localdate(),
+            )
+            deltas = Counter()
+            for comment_id, book_id, old_status in changed:
+                if old_status == Comment.COMMENT_STATUS_APPROVED:
+                    deltas[book_id] -= 1
+                elif status == Comment.COMMENT_STATUS_APPROVED:
+                    deltas[book_id] += 1
+            book_ids = [book_id for book_id, delta in deltas.items() if delta]
+            if book_ids:
+                Book.objects.filter(pk__in=book_ids).update(
+                    approved_comment_count=Case(*[
+                        When(pk=book_id, then=F('approved_comment_count') + deltas[book_id])
+                        for book_id in book_ids
+                    ]),
+                    date_time_modified=timezone.now(),
+                )
+        return updated, book_ids
+
+
 class Comment(models.Model):
     COMMENT_STATUS_WAITING= 'W'
     COMMENT_STATUS_APPROVED = 'A'
@@ -117,6 +323,14 @@ class Comment(models.Model):
     date_was_placed = models.DateField(auto_now=True)
     status = models.CharField(max_length=1, choices=COMMENT_STATUS, default=COMMENT_STATUS_WAITING)
 
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['book', 'status', 'date_was_sent'], name='comment_book_status_sent_idx'),
+            models.Index(fields=['status', 'date_was_sent'], name='comment_status_sent_idx'),
+        ]
+
 
 
 
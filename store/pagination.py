@@ -1,6 +1,199 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 
 class DefaultPagination(PageNumberPagination):
-    page_size = 10
\ No newline at end of file
+    page_size = 10
+
+
+def estimate_count(queryset):
+    # Unfiltered tables can use the row estimate kept by InnoDB instead of a COUNT(*) scan.
+    connection = connections[queryset.db]
+    if connection.vendor == 'mysql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES '
+                'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] is not None:
+            return row[0]
+    return queryset.count()
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks on the ordering columns instead of using OFFSET.
+
+    The ordering comes from `OrderingFilter` (or the view's `keyset_ordering`) and
+    `id` is always appended as a tiebreaker, so every cursor points at a unique row.
+    `?count=exact` or `?count=estimate` adds a `count` to the response.
+    """
+    page_size = 10
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    default_ordering = ('-id',)
+    tiebreaker = 'id'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(queryset, view)
+        self.count = self.get_count(queryset, request)
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            try:
+                values = self.to_python_values(queryset, cursor)
+                queryset = queryset.filter(self.get_seek_filter(values))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset.order_by(*self.ordering)[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        response = OrderedDict([('next', self.get_next_link())])
+        if self.count is not None:
+            response['count'] = self.count
+        response['results'] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count': {'type': 'integer'},
+                'results': schema,
+            },
+        }
+
+    def get_ordering(self, queryset, view):
+        ordering = list(queryset.query.order_by)
+        if not ordering:
+            ordering = list(getattr(view, 'keyset_ordering', None) or self.default_ordering)
+        for field in ordering:
+            if not isinstance(field, str) or '__' in field or field.lstrip('-') in ('', '?'):
+                raise ValueError(f'Keyset pagination cannot order by {field!r}.')
+        names = [field.lstrip('-') for field in ordering]
+        if self.tiebreaker not in names and 'pk' not in names:
+            descending = ordering[-1].startswith('-')
+            ordering.append(f'-{self.tiebreaker}' if descending else self.tiebreaker)
+        return ordering
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'exact':
+            return queryset.order_by().count()
+        if mode == 'estimate':
+            return estimate_count(queryset.order_by())
+        return None
+
+    def to_python_values(self, queryset, values):
+        # Cursors come from clients, so their values are checked against the ordering columns.
+        converted = []
+        for field, value in zip(self.ordering, values):
+            try:
+                model_field = queryset.model._meta.get_field(field.lstrip('-'))
+            except FieldDoesNotExist:
+                # Annotations such as the search rank are left to the database.
+                converted.append(value)
+                continue
+            if value is None and not model_field.null:
+                raise ValueError(f'{field} can not be null.')
+            converted.append(model_field.to_python(value))
+        return converted
+
+    def get_seek_filter(self, values):
+        # (a > x) OR (a = x AND b > y) OR ... with the direction of each column respected.
+        seek = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            seek |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return seek
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        values = [self.get_row_value(last, field.lstrip('-')) for field in self.ordering]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(values))
+
+    def get_row_value(self, row, name):
+        if isinstance(row, dict):
+            return row[name]
+        return getattr(row, name)
+
+    def encode_cursor(self, values):
+        payload = {'o': self.ordering, 'v': [self.to_cursor_value(value) for value in values]}
+        raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        return urlsafe_b64encode(raw).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            ordering, values = payload['o'], payload['v']
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+        # A cursor is only meaningful for the ordering it was created with.
+        if ordering != self.ordering or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def to_cursor_value(self, value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+
+class PageOrCursorPagination(DefaultPagination):
+    """
+    Page-number pagination unless the client asks for keyset pages with
+    `?pagination=cursor` (or follows a `?cursor=` link).
+    """
+    keyset_class = KeysetPagination
+    mode_query_param = 'pagination'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_requested(request):
+            self.keyset = self.keyset_class()
+            self.display_page_controls = False
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def keyset_requested(self, request):
+        params = request.query_params
+        return (params.get(self.mode_query_param) == 'cursor'
+                or self.keyset_class.cursor_query_param in params)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
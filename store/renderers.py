@@ -0,0 +1,128 @@
+import json
+import re
+from decimal import Decimal
+from uuid import uuid4
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+from .fast_serializers import FastSerializer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Decimals are written verbatim through orjson.Fragment, which older releases lack.
+if orjson is not None and not hasattr(orjson, 'Fragment'):
+    orjson = None
+
+
+class ExactJSONEncoder(encoders.JSONEncoder):
+    """
+    DRF's JSONEncoder, but Decimals are written as JSON numbers with their
+    exact digits instead of going through float.
+
+    The C encoder can not emit raw numbers for custom types, so Decimals are
+    encoded as strings carrying a marker and unquoted afterwards. The marker
+    starts with a NUL and holds a random token per encoder, so no real string
+    can match it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.marker = f'\x00{uuid4().hex}'
+        self.marker_re = re.compile(r'"%s([^"]*)"' % re.escape(json.dumps(self.marker)[1:-1]))
+
+    def default(self, obj):
+        if isinstance(obj, Decimal) and obj.is_finite():
+            return self.marker + str(obj)
+        return super().default(obj)
+
+    def encode(self, obj):
+        return self.marker_re.sub(r'\1', super().encode(obj))
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that keeps Decimals exact and can stream lists.
+
+    Compact output goes through orjson when it is installed, everything else
+    through json with ExactJSONEncoder.
+    """
+    encoder_class = ExactJSONEncoder
+    orjson_options = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+    fallback_encoder = encoders.JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.use_orjson(accepted_media_type, renderer_context or {}):
+            return self.orjson_dumps(data)
+        return super().render(data, accepted_media_type, renderer_context)
+
+    def use_orjson(self, accepted_media_type, renderer_context):
+        return (
+            orjson is not None and self.compact and not self.ensure_ascii
+            and self.get_indent(accepted_media_type, renderer_context) is None
+        )
+
+    def orjson_dumps(self, data):
+        content = orjson.dumps(data, default=self.orjson_default, option=self.orjson_options)
+        # The same escaping JSONRenderer does, so the output stays a JavaScript subset.
+        return content.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+    def orjson_default(self, obj):
+        if isinstance(obj, Decimal) and obj.is_finite():
+            return orjson.Fragment(str(obj))
+        return self.fallback_encoder.default(obj)
+
+    def render_stream(self, rows, accepted_media_type=None, batch_size=100):
+        """Yield the JSON array of `rows`, `batch_size` rows at a time."""
+        yield b'['
+        batch = []
+        first = True
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield self.render_batch(batch, first, accepted_media_type)
+                first = False
+                batch = []
+        if batch:
+            yield self.render_batch(batch, first, accepted_media_type)
+        yield b']'
+
+    def render_batch(self, batch, first, accepted_media_type):
+        # Rendering the batch as a list and dropping its brackets keeps one encoder call per batch.
+        content = self.render(batch, accepted_media_type)[1:-1]
+        return content if first else b',' + content
+
+
+class StreamingListMixin:
+    """
+    Streams unpaginated list responses rendered by FastJSONRenderer: rows are
+    read with `queryset.iterator()` and encoded chunk by chunk, so memory does
+    not grow with the size of the result.
+    """
+    stream_chunk_size = 500
+
+    def list(self, request, *args, **kwargs):
+        renderer = getattr(request, 'accepted_renderer', None)
+        if (
+            self.paginator is not None
+            or not isinstance(renderer, FastJSONRenderer)
+            or renderer.get_indent(request.accepted_media_type, {}) is not None
+        ):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer(queryset.iterator(chunk_size=self.stream_chunk_size), many=True)
+        if isinstance(serializer, FastSerializer):
+            rows = serializer.iter_data()
+        else:
+            rows = (serializer.child.to_representation(item) for item in serializer.instance)
+        return StreamingHttpResponse(
+            renderer.render_stream(rows, request.accepted_media_type),
+            content_type=renderer.media_type,
+        )
@@ -0,0 +1,43 @@
+import re
+from collections import Counter
+
+from .models import BookSearchTerm
+
+
+TOKEN_RE = re.compile(r'\w+')
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 64
+
+# Title hits rank above description hits.
+FIELD_WEIGHTS = {
+    'title': 3,
+    'description': 1,
+}
+
+
+def tokenize(text):
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in TOKEN_RE.findall(text.lower())
+        if len(token) >= MIN_TERM_LENGTH
+    ]
+
+
+def build_terms(book):
+    weights = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        for token in tokenize(getattr(book, field) or ''):
+            weights[token] += weight
+    return weights
+
+
+def index_books(books):
+    books = list(books)
+    if not books:
+        return
+    BookSearchTerm.objects.filter(book__in=books).delete()
+    BookSearchTerm.objects.bulk_create([
+        BookSearchTerm(book_id=book.pk, term=term, weight=weight)
+        for book in books
+        for term, weight in build_terms(book).items()
+    ])
@@ -1,24 +1,76 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from .models import *
-from django.db import transaction
+from collections import Counter
+from django.db import IntegrityError, NotSupportedError, connections, transaction
+from django.db.models import Case, F, PositiveIntegerField, ProtectedError, When
+from django.utils import timezone
+from . import cache
+from .exceptions import InsufficientInventory
+from .images import variant_urls
+from .search import FIELD_WEIGHTS, index_books
 
 class BookImageSerializer(serializers.ModelSerializer):
+    variants = serializers.SerializerMethodField()
+
     class Meta:
         model = BookImage
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'variants']
+
+    def get_variants(self, book_image):
+        urls = variant_urls(book_image.image, book_image.variants_ready)
+        request = self.context.get('request')
+        if urls and request is not None:
+            urls = {variant: request.build_absolute_uri(url) for variant, url in urls.items()}
+        return urls
     
     def create(self, validated_data):
         book_id = self.context['book_id']
-        return BookImage.objects.create(book_id=book_id, **validated_data)
+        # The upload keeps its blob locked until the row using it is committed.
+        with transaction.atomic():
+            return BookImage.objects.create(book_id=book_id, **validated_data)
     
 
-class BookSerializer(serializers.ModelSerializer):
+def parse_field_list(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def get_requested_fields(request, available):
+    """The names out of `available` kept by the `?fields=` and `?omit=` query parameters."""
+    names = set(available)
+    if request is None or request.method not in SAFE_METHODS:
+        return names
+    fields = request.query_params.get('fields')
+    omit = request.query_params.get('omit')
+    if fields:
+        names &= parse_field_list(fields)
+    if omit:
+        names -= parse_field_list(omit)
+    return names
+
+
+class DynamicFieldsMixin:
+    """
+    Renders only the fields asked for with `?fields=a,b` and drops those in `?omit=a,b`.
+    Unknown names are ignored, and writes always use every field.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = get_requested_fields(self.context.get('request'), self.fields)
+        for name in list(self.fields):
+            if name not in requested:
+                self.fields.pop(name)
+
+
+class BookSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     category = serializers.StringRelatedField()
     images = BookImageSerializer(many=True, read_only=True)
 
     class Meta:
         model = Book
-        fields = ['id', 'title','slug', 'images', 'description', 'price','inventory', 'category']
+        fields = ['id', 'title','slug', 'images', 'description', 'price', 'effective_price', 'inventory', 'category', 'approved_comment_count']
+        read_only_fields = ['effective_price', 'approved_comment_count']
 
 
 class SimpleBookSerializer(serializers.ModelSerializer):
@@ -27,29 +79,307 @@ class SimpleBookSerializer(serializers.ModelSerializer):
         fields = ['id','title', 'price']
 
 
+class CartBookSerializer(SimpleBookSerializer):
+    # Line totals are computed from effective_price, so the line shows it too.
+    class Meta(SimpleBookSerializer.Meta):
+        fields = [*SimpleBookSerializer.Meta.fields, 'effective_price']
+
+
+BULK_MAX_ROWS = 1000
+BULK_BATCH_SIZE = 500
+
+
+class BulkCreateBookSerializer(serializers.ModelSerializer):
+    # Validated without queries; categories are checked for all rows at once.
+    category = serializers.IntegerField(source='category_id')
+
+    class Meta:
+        model = Book
+        fields = ['title', 'slug', 'description', 'price', 'inventory', 'category']
+
+
+class BulkUpdateBookSerializer(BulkCreateBookSerializer):
+    id = serializers.IntegerField()
+
+    class Meta(BulkCreateBookSerializer.Meta):
+        fields = ['id', *BulkCreateBookSerializer.Meta.fields]
+
+    def validate(self, attrs):
+        # Partial validation skips required fields, but every row must name its book.
+        if 'id' not in attrs:
+            raise serializers.ValidationError({'id': ['This field is required.']})
+        return attrs
+
+
+def get_bulk_rows(data):
+    if not isinstance(data, list):
+        raise serializers.ValidationError({'error': 'Expected a list.'})
+    if not data:
+        raise serializers.ValidationError({'error': 'This list may not be empty.'})
+    if len(data) > BULK_MAX_ROWS:
+        raise serializers.ValidationError({'error': f'Ensure this list has no more than {BULK_MAX_ROWS} elements.'})
+    return data
+
+
+def row_error(index, field, message):
+    return {'index': index, 'errors': {field: [message]}}
+
+
+def validate_book_rows(rows, serializer_class, partial=False):
+    """Validate every row and return the valid `(index, data)` pairs and the row errors."""
+    valid = []
+    errors = []
+    for index, row in enumerate(rows):
+        serializer = serializer_class(data=row, partial=partial)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+
+    category_ids = {data['category_id'] for index, data in valid if 'category_id' in data}
+    existing = set(Category.objects.filter(pk__in=category_ids).values_list('pk', flat=True))
+    checked = []
+    for index, data in valid:
+        if 'category_id' in data and data['category_id'] not in existing:
+            errors.append(row_error(index, 'category', 'NO category with the given ID!'))
+        else:
+            checked.append((index, data))
+    return checked, errors
+
+
+def change_books_counts(deltas):
+    """Apply {category_id: delta} to Category.books_count with one UPDATE."""
+    deltas = {category_id: delta for category_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    Category.objects.filter(pk__in=deltas).update(books_count=Case(
+        *[
+            When(pk=category_id, books_count__gte=-delta, then=F('books_count') + delta)
+            for category_id, delta in deltas.items()
+        ],
+        default=F('books_count'),
+        output_field=PositiveIntegerField(),
+    ))
+
+
+def insert_books(books):
+    """bulk_create `books` and return them with their primary keys set."""
+    connection = connections[Book.objects.db]
+    if connection.features.can_return_rows_from_bulk_insert:
+        return Book.objects.bulk_create(books)
+    if connection.vendor not in ('mysql', 'sqlite'):
+        raise NotSupportedError('Bulk created books need RETURNING or LAST_INSERT_ID().')
+    # One multi-row INSERT gets consecutive ids, `auto_increment_increment` apart on
+    # MySQL (replication setups often use more than 1). This connection reports the
+    # first of them on MySQL and the last one on SQLite; other sessions can not interfere.
+    Book.objects.bulk_create(books, batch_size=len(books))
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute('SELECT LAST_INSERT_ID(), @@SESSION.auto_increment_increment')
+            first_id, step = cursor.fetchone()
+        else:
+            cursor.execute('SELECT last_insert_rowid()')
+            first_id, step = cursor.fetchone()[0] - len(books) + 1, 1
+    for offset, book in enumerate(books):
+        book.pk = first_id + offset * step
+    return books
+
+
+def bulk_create_books(rows):
+    """
+    Insert the valid rows with bulk_create, in one transaction per batch, and do
+    what the Book signals would have done for each row. Returns the new ids and the row errors.
+    """
+    valid, errors = validate_book_rows(rows, BulkCreateBookSerializer)
+    created_ids = []
+    for start in range(0, len(valid), BULK_BATCH_SIZE):
+        # A new book has no discount yet, so it sells at its price.
+        books = [Book(effective_price=data['price'], **data) for index, data in valid[start:start + BULK_BATCH_SIZE]]
+        with transaction.atomic():
+            books = insert_books(books)
+            index_books(books)
+            counts = Counter(book.category_id for book in books)
+            change_books_counts(counts)
+            ids = [book.pk for book in books]
+            cache.invalidate('books', *ids)
+            cache.invalidate('categories', *counts)
+        created_ids += ids
+    return created_ids, errors
+
+
+def bulk_update_books(rows):
+    """
+    Apply partial updates with bulk_update, in one transaction per batch, keeping the
+    search index, category counts and effective prices in step. Returns the updated ids and the row errors.
+    """
+    valid, errors = validate_book_rows(rows, BulkUpdateBookSerializer, partial=True)
+    seen = set()
+    unique = []
+    for index, data in valid:
+        if data['id'] in seen:
+            errors.append(row_error(index, 'id', 'This book is already updated by another row.'))
+        else:
+            seen.add(data['id'])
+            unique.append((index, data))
+
+    updated_ids = []
+    for start in range(0, len(unique), BULK_BATCH_SIZE):
+        batch = unique[start:start + BULK_BATCH_SIZE]
+        with transaction.atomic():
+            books = Book.objects.select_for_update().in_bulk([data['id'] for index, data in batch])
+            now = timezone.now()
+            fields = {'date_time_modified'}
+            changed = []
+            reindex = []
+            repriced = []
+            deltas = Counter()
+            for index, data in batch:
+                book = books.get(data['id'])
+                if book is None:
+                    errors.append(row_error(index, 'id', 'NO book with the given ID!'))
+                    continue
+                updated_ids.append(book.pk)
+                changes = {name: value for name, value in data.items() if name != 'id' and getattr(book, name) != value}
+                if not changes:
+                    continue
+                if 'category_id' in changes:
+                    deltas[book.category_id] -= 1
+                    deltas[changes['category_id']] += 1
+                for name, value in changes.items():
+                    setattr(book, name, value)
+                book.date_time_modified = now
+                fields.update(changes)
+                changed.append(book)
+                if FIELD_WEIGHTS.keys() & changes.keys():
+                    reindex.append(book)
+                if 'price' in changes:
+                    repriced.append(book.pk)
+
+            Book.objects.bulk_update(changed, sorted(fields))
+            index_books(reindex)
+            if repriced:
+                Book.objects.filter(pk__in=repriced).refresh_effective_prices()
+            change_books_counts(deltas)
+            cache.invalidate('books', *[book.pk for book in changed])
+            cache.invalidate('categories', *[category_id for category_id, delta in deltas.items() if delta])
+    return updated_ids, errors
+
+
+def bulk_delete_books(ids):
+    """
+    Delete the books in one transaction per batch. Books referenced by an order item
+    are refused with one query up front; the deletes themselves go through the ORM
+    so the Book signals run. Returns the deleted ids and the row errors.
+    """
+    ids = serializers.ListField(child=serializers.IntegerField()).run_validation(ids)
+    existing = set(Book.objects.filter(pk__in=ids).values_list('pk', flat=True))
+    ordered = set(OrderItem.objects.filter(book_id__in=ids).values_list('book_id', flat=True).distinct())
+
+    errors = []
+    deletable = []
+    seen = set()
+    for index, book_id in enumerate(ids):
+        if book_id not in existing:
+            errors.append(row_error(index, 'id', 'NO book with the given ID!'))
+        elif book_id in ordered:
+            errors.append(row_error(index, 'id', 'Product cannot be deleted because it is associated with an order item.'))
+        elif book_id in seen:
+            errors.append(row_error(index, 'id', 'This book is already deleted by another row.'))
+        else:
+            seen.add(book_id)
+            deletable.append(book_id)
+
+    deleted_ids = []
+    for start in range(0, len(deletable), BULK_BATCH_SIZE):
+        batch = deletable[start:start + BULK_BATCH_SIZE]
+        try:
+            with transaction.atomic():
+                Book.objects.filter(pk__in=batch).delete()
+        except ProtectedError as exc:
+            # Ordered after the check above: refuse those and delete the rest.
+            protected = {item.book_id for item in exc.protected_objects if isinstance(item, OrderItem)}
+            errors += [
+                row_error(ids.index(book_id), 'id', 'Product cannot be deleted because it is associated with an order item.')
+                for book_id in batch if book_id in protected
+            ]
+            batch = [book_id for book_id in batch if book_id not in protected]
+            with transaction.atomic():
+                Book.objects.filter(pk__in=batch).delete()
+        deleted_ids += batch
+    return deleted_ids, errors
+
+
 class CommentSerializer(serializers.ModelSerializer):
-    book = serializers.StringRelatedField()
+    # The book is already identified by the URL, so render its id instead of joining it.
+    book = serializers.IntegerField(source='book_id', read_only=True)
 
     class Meta:
         model = Comment
-        fields = ['id', 'body', 'book','date_was_placed']
+        fields = ['id', 'body', 'book', 'status', 'date_was_placed']
+        read_only_fields = ['status']
 
     def create(self, validated_data):
         book_id = self.context['book_id']
         return Comment.objects.create(book_id=book_id, **validated_data)
 
 
+class ModerateCommentsSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=1000)
+    status = serializers.ChoiceField(choices=Comment.COMMENT_STATUS)
+
+    def save(self, **kwargs):
+        comments = self.context['comments'].filter(pk__in=self.validated_data['ids'])
+        updated, book_ids = comments.set_status(self.validated_data['status'])
+        cache.invalidate('books', *book_ids)
+        return updated
+
+
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id','title', 'books_count']
+        read_only_fields = ['books_count']
+
+
+class ReassignCategorySerializer(serializers.Serializer):
+    target_category_id = serializers.IntegerField()
+
+    def validate_target_category_id(self, target_category_id):
+        if target_category_id == self.context['category_id']:
+            raise serializers.ValidationError('Books can not be moved into the category being deleted.')
+        if not Category.objects.filter(pk=target_category_id).exists():
+            raise serializers.ValidationError('NO category with the given ID!')
+        return target_category_id
+
+    def save(self, **kwargs):
+        # Moves every book in one UPDATE and deletes the emptied category in the same transaction.
+        category_id = self.context['category_id']
+        target_category_id = self.validated_data['target_category_id']
+
+        with transaction.atomic():
+            locked = set(
+                Category.objects.select_for_update()
+                .filter(pk__in=[category_id, target_category_id])
+                .order_by('pk')
+                .values_list('pk', flat=True)
+            )
+            if target_category_id not in locked:
+                raise serializers.ValidationError({'target_category_id': ['NO category with the given ID!']})
+
+            moved_books = Book.objects.filter(category_id=category_id).update(
+                category_id=target_category_id,
+                date_time_modified=timezone.now(),
+            )
+            Category.objects.filter(pk=target_category_id).update(books_count=F('books_count') + moved_books)
+            Category.objects.filter(pk=category_id).delete()
+
+            cache.invalidate_all('books')
+            cache.invalidate('categories', category_id, target_category_id)
+
+        return moved_books
 
-    books_count = serializers.SerializerMethodField(read_only=True)
 
-    def get_books_count(self, category):
-        return category.books.count()
-    
 class SimpleAddressSerializer(serializers.ModelSerializer):
     class Meta:
         model = Address
@@ -144,11 +474,8 @@ class CartItemSerializer(serializers.ModelSerializer):
         model = CartItem
         fields = ['id','book','quantity','total_price']
 
-    book = SimpleBookSerializer()    
-    total_price = serializers.SerializerMethodField(read_only=True)
-
-    def get_total_price(self, item):
-        return item.book.price * item.quantity
+    book = CartBookSerializer()    
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
 
 
 class CreateCartItemSerializer(serializers.ModelSerializer):
@@ -156,27 +483,49 @@ class CreateCartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
         fields = ['id','book_id', 'quantity']
+        extra_kwargs = {'quantity': {'min_value': 1}}
 
     def save(self, **kwargs):
         cart_id = self.context['cart_id']
         book_id = self.validated_data['book_id']
         quantity = self.validated_data['quantity']
 
-        try:
-            cart_item = CartItem.objects.get(cart_id=cart_id, book_id=book_id)
-            cart_item.quantity += quantity
-            cart_item.save()
-            self.instance = cart_item
-        except CartItem.DoesNotExist:
-            cart_item = CartItem.objects.create(cart_id=cart_id,
-                                                **self.validated_data)
-            return self.instance
+        add_to_cart(cart_id, {book_id: quantity})
+        self.instance = CartItem.objects.get(cart_id=cart_id, book_id=book_id)
+        return self.instance
+
+
+class BatchCreateCartItemSerializer(serializers.Serializer):
+    items = CreateCartItemSerializer(many=True, allow_empty=False)
+
+    def save(self, **kwargs):
+        cart_id = self.context['cart_id']
+        quantities = {}
+        for item in self.validated_data['items']:
+            quantities[item['book_id']] = quantities.get(item['book_id'], 0) + item['quantity']
+
+        add_to_cart(cart_id, quantities)
+        return list(
+            CartItem.objects.select_related('book')
+            .filter(cart_id=cart_id, book_id__in=quantities)
+            .order_by('id')
+        )
+
+
+def add_to_cart(cart_id, quantities):
+    try:
+        with transaction.atomic():
+            CartItem.objects.add_quantities(cart_id, quantities)
+            Cart.objects.filter(pk=cart_id).touch()
+    except IntegrityError:
+        raise serializers.ValidationError('NO cart or book with the given ID!')
     
 
 class UpdateCartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
         fields = ['quantity']
+        extra_kwargs = {'quantity': {'min_value': 1}}
 
 
 class CartSerializer(serializers.ModelSerializer):
@@ -186,11 +535,7 @@ class CartSerializer(serializers.ModelSerializer):
 
     cart_id = serializers.UUIDField(read_only=True)
     items = CartItemSerializer(many=True, read_only=True)
-    total_price = serializers.SerializerMethodField()
-
-    def get_total_price(self, cart:Cart):
-        return sum([item.book.price * item.quantity for item in cart.items.all()])
-    
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -204,10 +549,18 @@ class OrderItemSerializer(serializers.ModelSerializer):
 class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
-        fields = ['id', 'orderitems', 'status', 'customer']
+        fields = ['id', 'orderitems', 'status', 'customer', 'placed_at', 'total_amount', 'item_count']
     orderitems = OrderItemSerializer(many=True)
 
 
+class OrderSummarySerializer(serializers.Serializer):
+    customer_id = serializers.IntegerField()
+    order_count = serializers.IntegerField()
+    item_count = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=12, decimal_places=2)
+    last_order_at = serializers.DateTimeField()
+
+
 class UpdateOrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
@@ -215,36 +568,91 @@ class UpdateOrderSerializer(serializers.ModelSerializer):
 
 
 
+def reserve_inventory(quantities):
+    """
+    Lock the books of an order, check stock and decrement it in one UPDATE.
+    Must run inside the checkout transaction; returns {book_id: unit_price}.
+    """
+    # Rows are locked in primary key order so concurrent checkouts can not deadlock.
+    books = {
+        book_id: (inventory, effective_price)
+        for book_id, inventory, effective_price in Book.objects.select_for_update()
+        .filter(pk__in=quantities)
+        .order_by('pk')
+        .values_list('pk', 'inventory', 'effective_price')
+    }
+    # Books deleted since the cart was read have nothing left to sell.
+    conflicts = [
+        {'book_id': book_id, 'requested': quantity, 'available': books.get(book_id, (0,))[0]}
+        for book_id, quantity in sorted(quantities.items())
+        if book_id not in books or books[book_id][0] < quantity
+    ]
+    if conflicts:
+        raise InsufficientInventory(conflicts)
+
+    Book.objects.filter(pk__in=quantities).update(
+        inventory=Case(*[
+            When(pk=book_id, then=F('inventory') - quantity)
+            for book_id, quantity in quantities.items()
+        ]),
+        date_time_modified=timezone.now(),
+    )
+    cache.invalidate('books', *quantities)
+    return {book_id: effective_price for book_id, (inventory, effective_price) in books.items()}
+
+
 class CreateOrderSerializer(serializers.Serializer):
     cart_id = serializers.UUIDField()
 
-    def validate_cart_id(self, cart_id):
-        if not Cart.objects.filter(pk=cart_id).exists():
-            raise serializers.ValidationError('NO cart with the given ID!')
-        if CartItem.objects.filter(cart_id=cart_id).count() == 0:
-            raise serializers.ValidationError('Cart is Empty.')
-        return cart_id
+    def validate(self, attrs):
+        # Existence, emptiness and the items themselves come from one LEFT JOIN;
+        # save() reuses the loaded items instead of querying the cart again.
+        rows = list(
+            Cart.objects.filter(pk=attrs['cart_id'])
+            .values_list('items__book_id', 'items__quantity')
+        )
+        if not rows:
+            raise serializers.ValidationError({'cart_id': ['NO cart with the given ID!']})
+        items = [(book_id, quantity) for book_id, quantity in rows if book_id is not None]
+        if not items:
+            raise serializers.ValidationError({'cart_id': ['Cart is Empty.']})
+        # Checkout subtracts these from stock, so a negative line would add inventory.
+        invalid = [
+            {'book_id': book_id, 'quantity': quantity}
+            for book_id, quantity in items if quantity < 1
+        ]
+        if invalid:
+            raise serializers.ValidationError({'cart_id': ['Cart has items with a quantity below 1.'], 'items': invalid})
+        attrs['items'] = items
+        return attrs
     
     def save(self, **kwargs):
         with transaction.atomic():
             cart_id = self.validated_data['cart_id']
+            cart_items = self.validated_data['items']
 
-            customer = Customer.objects.select_related('user').get(user_id = self.context['user_id'])
+            # A second submit of the same cart waits here and then finds it gone.
+            if not Cart.objects.select_for_update().filter(pk=cart_id).exists():
+                raise serializers.ValidationError({'cart_id': ['NO cart with the given ID!']})
+
+            customer_id = Customer.objects.values_list('id', flat=True).get(user_id = self.context['user_id'])
+
+            prices = reserve_inventory(dict(cart_items))
 
             order = Order()
-            order.customer = customer
+            order.customer_id = customer_id
+            order.total_amount = sum(prices[book_id] * quantity for book_id, quantity in cart_items)
+            order.item_count = sum(quantity for book_id, quantity in cart_items)
             order.save()
 
-            cart_items = CartItem.objects.select_related('book').filter(cart_id=cart_id)
-
             order_items = [
                 OrderItem(
                 order=order,
-                book = item.book,
-                quantity = item.quantity,
-                unit_price = item.book.price
+                book_id = book_id,
+                quantity = quantity,
+                unit_price = prices[book_id]
             
-            )for item in cart_items ]
+            )for book_id, quantity in cart_items ]
 
             OrderItem.objects.bulk_create(order_items)
 
@@ -1,10 +1,242 @@
-from django.db.models.signals import post_save
+from django.db.models import F, Max
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save
 from django.conf import settings
 from django.dispatch import receiver
-from store.models import Customer
+from django.utils import timezone
+from store import cache
+from store.images import release_image, schedule_variants
+from store.models import Book, BookImage, Category, Comment, Customer, Discount, discounted_price
+from store.search import FIELD_WEIGHTS, index_books
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_customer(sender, **kwargs):
     if kwargs['created']:
-        Customer.objects.create(user=kwargs['instance'])
\ No newline at end of file
+        Customer.objects.create(user=kwargs['instance'])
+
+
+@receiver(post_save, sender=Book)
+def update_search_index(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not FIELD_WEIGHTS.keys() & set(update_fields):
+        return
+    # Deferred fields are neither saved nor in __dict__, so only loaded ones are compared.
+    changed = created or any(
+        field in instance.__dict__ and instance.__dict__[field] != instance._saved_search_text.get(field)
+        for field in FIELD_WEIGHTS
+    )
+    if changed:
+        index_books([instance])
+    instance._saved_search_text = {field: instance.__dict__.get(field) for field in FIELD_WEIGHTS}
+
+
+def change_books_count(category_id, delta):
+    categories = Category.objects.filter(pk=category_id)
+    if delta < 0:
+        categories = categories.filter(books_count__gte=-delta)
+    categories.update(books_count=F('books_count') + delta)
+
+
+@receiver(post_init, sender=Book)
+def remember_saved_book_fields(sender, instance, **kwargs):
+    instance._saved_category_id = instance.__dict__.get('category_id')
+    instance._saved_price = instance.__dict__.get('price')
+    instance._saved_search_text = {field: instance.__dict__.get(field) for field in FIELD_WEIGHTS}
+
+
+@receiver(post_save, sender=Book)
+def update_books_count_on_save(sender, instance, created, **kwargs):
+    previous_category_id = instance._saved_category_id
+    if created:
+        change_books_count(instance.category_id, 1)
+        cache.invalidate('categories', instance.category_id)
+    elif previous_category_id is not None and previous_category_id != instance.category_id:
+        change_books_count(previous_category_id, -1)
+        change_books_count(instance.category_id, 1)
+        cache.invalidate('categories', previous_category_id, instance.category_id)
+    instance._saved_category_id = instance.category_id
+
+
+@receiver(post_delete, sender=Book)
+def update_books_count_on_delete(sender, instance, **kwargs):
+    change_books_count(instance.category_id, -1)
+
+
+@receiver(post_save, sender=Book)
+def invalidate_book_cache_on_save(sender, instance, created, **kwargs):
+    cache.invalidate('books', instance.pk)
+
+
+@receiver(pre_delete, sender=Book)
+def remember_book_discounts(sender, instance, **kwargs):
+    instance._discount_ids = list(instance.discount.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Book)
+def invalidate_book_cache_on_delete(sender, instance, **kwargs):
+    cache.invalidate('books', instance.pk)
+    cache.invalidate('categories', instance.category_id)
+    cache.invalidate('discounts', *getattr(instance, '_discount_ids', []))
+
+
+@receiver(post_save, sender=BookImage)
+@receiver(post_delete, sender=BookImage)
+def touch_book_on_image_change(sender, instance, **kwargs):
+    # Keeps Book.date_time_modified usable as the validator for everything a book renders.
+    Book.objects.filter(pk=instance.book_id).update(date_time_modified=timezone.now())
+    cache.invalidate('books', instance.book_id)
+
+
+@receiver(post_init, sender=BookImage)
+def remember_saved_image(sender, instance, **kwargs):
+    instance._saved_image = instance.__dict__.get('image')
+
+
+@receiver(pre_save, sender=BookImage)
+def reset_variants_on_image_change(sender, instance, **kwargs):
+    if instance.image.name != getattr(instance._saved_image, 'name', instance._saved_image):
+        instance.variants_ready = False
+
+
+@receiver(post_save, sender=BookImage)
+def generate_variants_on_save(sender, instance, created, **kwargs):
+    saved_name = getattr(instance._saved_image, 'name', instance._saved_image)
+    if not created and saved_name and saved_name != instance.image.name:
+        release_image(saved_name)
+    instance._saved_image = instance.image.name
+    if instance.image and not instance.variants_ready:
+        # A re-upload of known content shares the blob, and so its variants.
+        if BookImage.objects.filter(image=instance.image.name, variants_ready=True).exists():
+            BookImage.objects.filter(pk=instance.pk).update(variants_ready=True)
+            instance.variants_ready = True
+        else:
+            schedule_variants(instance.pk)
+
+
+@receiver(post_delete, sender=BookImage)
+def release_image_on_delete(sender, instance, **kwargs):
+    release_image(instance.image.name)
+
+
+@receiver(post_save, sender=Category)
+def invalidate_category_cache_on_save(sender, instance, created, **kwargs):
+    cache.invalidate('categories', instance.pk)
+    if not created:
+        # Book payloads render the category title.
+        Book.objects.filter(category_id=instance.pk).update(date_time_modified=timezone.now())
+        cache.invalidate_all('books')
+
+
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache_on_delete(sender, instance, **kwargs):
+    cache.invalidate('categories', instance.pk)
+
+
+@receiver(post_save, sender=Discount)
+@receiver(post_delete, sender=Discount)
+def invalidate_discount_cache(sender, instance, **kwargs):
+    cache.invalidate('discounts', instance.pk)
+
+
+@receiver(m2m_changed, sender=Book.discount.through)
+def invalidate_discount_cache_on_books_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        cache.invalidate('discounts', instance.pk)
+    elif pk_set is None:
+        cache.invalidate_all('discounts')
+    else:
+        cache.invalidate('discounts', *pk_set)
+
+
+def best_discount_for(book_id):
+    return Discount.objects.filter(books=book_id).aggregate(best=Max('amount'))['best']
+
+
+def refresh_effective_prices(books):
+    changed = books.refresh_effective_prices()
+    cache.invalidate('books', *changed)
+
+
+@receiver(pre_save, sender=Book)
+def set_effective_price(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None:
+        return
+    if instance._state.adding:
+        # New books can not have discounts linked yet.
+        instance.effective_price = instance.price
+    elif instance.price != instance._saved_price:
+        instance.effective_price = discounted_price(instance.price, best_discount_for(instance.pk))
+
+
+@receiver(post_save, sender=Book)
+def update_effective_price_on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'price' in update_fields:
+        refresh_effective_prices(Book.objects.filter(pk=instance.pk))
+    instance._saved_price = instance.price
+
+
+@receiver(m2m_changed, sender=Book.discount.through)
+def update_effective_price_on_discounts_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_book_ids = list(instance.books.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        # Keep the in-memory book in step so a later save() does not write back a stale price.
+        instance.effective_price = discounted_price(instance.price, best_discount_for(instance.pk))
+        Book.objects.filter(pk=instance.pk).update(
+            effective_price=instance.effective_price,
+            date_time_modified=timezone.now(),
+        )
+        cache.invalidate('books', instance.pk)
+    elif action == 'post_clear':
+        refresh_effective_prices(Book.objects.filter(pk__in=instance._cleared_book_ids))
+    else:
+        refresh_effective_prices(Book.objects.filter(pk__in=pk_set))
+
+
+@receiver(post_save, sender=Discount)
+def update_effective_price_on_discount_save(sender, instance, created, **kwargs):
+    if not created:
+        refresh_effective_prices(Book.objects.filter(discount=instance))
+
+
+@receiver(pre_delete, sender=Discount)
+def remember_discounted_books(sender, instance, **kwargs):
+    instance._book_ids = list(instance.books.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Discount)
+def update_effective_price_on_discount_delete(sender, instance, **kwargs):
+    refresh_effective_prices(Book.objects.filter(pk__in=instance._book_ids))
+
+
+def change_approved_comment_count(book_id, delta):
+    books = Book.objects.filter(pk=book_id)
+    if delta < 0:
+        books = books.filter(approved_comment_count__gte=-delta)
+    books.update(approved_comment_count=F('approved_comment_count') + delta, date_time_modified=timezone.now())
+    cache.invalidate('books', book_id)
+
+
+@receiver(post_init, sender=Comment)
+def remember_comment_status(sender, instance, **kwargs):
+    instance._saved_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Comment)
+def update_approved_comment_count_on_save(sender, instance, created, **kwargs):
+    was_approved = not created and instance._saved_status == Comment.COMMENT_STATUS_APPROVED
+    is_approved = instance.status == Comment.COMMENT_STATUS_APPROVED
+    if is_approved != was_approved:
+        change_approved_comment_count(instance.book_id, 1 if is_approved else -1)
+    instance._saved_status = instance.status
+
+
+@receiver(post_delete, sender=Comment)
+def update_approved_comment_count_on_delete(sender, instance, **kwargs):
+    if instance.status == Comment.COMMENT_STATUS_APPROVED:
+        change_approved_comment_count(instance.book_id, -1)
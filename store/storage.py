@@ -0,0 +1,93 @@
+import hashlib
+import os
+import re
+from tempfile import NamedTemporaryFile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+
+# Originals only: variants (<hash>.thumbnail.png) are rewritten in place when regenerated.
+HASHED_NAME_RE = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.[^/.]*)?$')
+
+
+def is_hashed_name(name):
+    return bool(name and HASHED_NAME_RE.search(name))
+
+
+class ContentHashStorage(FileSystemStorage):
+    """
+    Stores every upload once, under the SHA-256 of its content:
+    `store/images/cover.jpg` is saved as `store/images/<hash[:2]>/<hash>.jpg`.
+
+    The content is hashed while it is streamed to a temporary file, which is then
+    moved into place, or dropped when a blob with the same hash already exists.
+    Rows share the name, so deleting a blob is left to whoever knows the references.
+
+    Saving locks the blob (see `store.images.lock_blob`) until the surrounding
+    transaction ends, so save inside the transaction that stores the name.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Names are only known after hashing; identical names mean identical content.
+        return name
+
+    def hashed_name(self, name, digest):
+        directory, filename = os.path.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest[:2], f'{digest}{ext}').replace('\\', '/')
+
+    def _save(self, name, content):
+        from .images import lock_blob
+
+        temp_path, digest = self._write_temp(name, content)
+        hashed = self.hashed_name(name, digest)
+        with transaction.atomic():
+            # Held until the caller commits: release_image() can not delete the blob in between.
+            lock_blob(hashed)
+            if os.path.exists(self.path(hashed)):
+                os.unlink(temp_path)
+                return hashed
+            self._move_into_place(temp_path, hashed)
+        return hashed
+
+    def save_derived(self, name, content):
+        """Save a file derived from a blob (a resized variant) under the exact `name`, replacing it."""
+        temp_path, _ = self._write_temp(name, content)
+        self._move_into_place(temp_path, name)
+        return name
+
+    def _write_temp(self, name, content):
+        directory = os.path.dirname(self.path(name))
+        os.makedirs(directory, mode=self.directory_permissions_mode or 0o777, exist_ok=True)
+        digest = hashlib.sha256()
+        with NamedTemporaryFile(dir=directory, prefix='.upload-', delete=False) as temp:
+            try:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode('utf-8')
+                    digest.update(chunk)
+                    temp.write(chunk)
+            except BaseException:
+                temp.close()
+                os.unlink(temp.name)
+                raise
+        return temp.name, digest.hexdigest()
+
+    def _move_into_place(self, temp_path, name):
+        full_path = self.path(name)
+        os.makedirs(os.path.dirname(full_path), mode=self.directory_permissions_mode or 0o777, exist_ok=True)
+        os.chmod(temp_path, self.file_permissions_mode if self.file_permissions_mode is not None else 0o644)
+        os.replace(temp_path, full_path)
+
+
+_book_image_storage = None
+
+
+def book_image_storage():
+    global _book_image_storage
+    if _book_image_storage is None:
+        _book_image_storage = ContentHashStorage()
+    return _book_image_storage
@@ -1,3 +1,474 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+from base64 import urlsafe_b64encode
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import skipUnless
+from unittest.mock import PropertyMock, patch
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .exceptions import InsufficientInventory
+from .fast_serializers import FastSerializer
+from .filters import BookFilter
+from .media import IMMUTABLE_CACHE_CONTROL, get_cache_control
+from .models import Address, Book, BookImage, BookSearchTerm, Cart, CartItem, Category, Customer, ImageBlob, Order, OrderItem
+from .renderers import FastJSONRenderer
+from .serializers import (
+    BookSerializer, CartItemSerializer, CartSerializer, CreateOrderSerializer, CustomerSerializer, OrderSerializer,
+    SimpleBookSerializer,
+)
+
+
+def make_book(category, **kwargs):
+    fields = {'title': 'Book', 'slug': 'book', 'description': 'A book', 'price': 10, 'inventory': 10, 'category': category}
+    fields.update(kwargs)
+    return Book.objects.create(**fields)
+
+
+def make_cart(*items):
+    cart = Cart.objects.create()
+    CartItem.objects.bulk_create(CartItem(cart=cart, book=book, quantity=quantity) for book, quantity in items)
+    return cart
+
+
+def make_user(index=0):
+    return get_user_model().objects.create_user(username=f'user{index}', email=f'user{index}@example.com')
+
+
+def checkout(user, cart):
+    serializer = CreateOrderSerializer(data={'cart_id': str(cart.pk)}, context={'user_id': user.pk})
+    serializer.is_valid(raise_exception=True)
+    return serializer.save()
+
+
+def encode_cursor(payload):
+    return urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        category = Category.objects.create(title='Novels')
+        for index in range(3):
+            make_book(category, title=f'Book {index}')
+
+    def test_follows_next_links(self):
+        response = self.client.get('/store/books/?pagination=cursor')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 3)
+        self.assertIsNone(response.json()['next'])
+
+    def test_cursor_with_values_of_the_wrong_type_is_not_found(self):
+        cursor = encode_cursor({'o': ['-id'], 'v': ['xx']})
+        response = self.client.get(f'/store/books/?cursor={cursor}')
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_for_another_ordering_is_not_found(self):
+        cursor = encode_cursor({'o': ['price', 'id'], 'v': ['1.00', 1]})
+        response = self.client.get(f'/store/books/?cursor={cursor}')
+        self.assertEqual(response.status_code, 404)
+
+    def test_garbage_cursor_is_not_found(self):
+        response = self.client.get('/store/books/?cursor=%%%')
+        self.assertEqual(response.status_code, 404)
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.book = make_book(Category.objects.create(title='Novels'), title='Silver Harbor', description='A sea story')
+
+    def test_search_ranks_title_matches(self):
+        response = APIClient().get('/store/books/?search=harbor')
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.book.pk])
+
+    def test_price_only_save_keeps_the_index(self):
+        book = Book.objects.get(pk=self.book.pk)
+        book.price = 20
+        with patch('store.signals.signal_handlers.index_books') as index_books:
+            book.save()
+        index_books.assert_not_called()
+
+    def test_title_change_reindexes(self):
+        book = Book.objects.get(pk=self.book.pk)
+        book.title = 'Golden Harbor'
+        book.save()
+        terms = set(BookSearchTerm.objects.filter(book=book).values_list('term', flat=True))
+        self.assertIn('golden', terms)
+        self.assertNotIn('silver', terms)
+
+
+class ConditionalListTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.book = make_book(Category.objects.create(title='Novels'))
+
+    def test_unchanged_list_is_not_modified_with_one_query(self):
+        etag = self.client.get('/store/books/')['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get('/store/books/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_change_moves_the_list_etag(self):
+        etag = self.client.get('/store/books/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.get(pk=self.book.pk).delete()
+        response = self.client.get('/store/books/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_write_without_invalidation_moves_the_list_etag(self):
+        # As done by another process with its own cache.
+        etag = self.client.get('/store/books/')['ETag']
+        Book.objects.filter(pk=self.book.pk).update(date_time_modified=timezone.now())
+        response = self.client.get('/store/books/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_malformed_id_is_not_found(self):
+        self.assertEqual(self.client.get('/store/books/abc/').status_code, 404)
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.book = make_book(Category.objects.create(title='Novels'), inventory=5)
+        self.user = make_user()
+
+    def test_checkout_queries(self):
+        other = make_book(self.book.category, title='Other', slug='other')
+        cart = make_cart((self.book, 2), (other, 1))
+        with self.assertNumQueries(1):
+            serializer = CreateOrderSerializer(data={'cart_id': str(cart.pk)}, context={'user_id': self.user.pk})
+            serializer.is_valid(raise_exception=True)
+        with self.assertNumQueries(11):
+            serializer.save()
+
+    def test_second_submit_of_a_cart_is_rejected(self):
+        cart = make_cart((self.book, 2))
+        first = CreateOrderSerializer(data={'cart_id': str(cart.pk)}, context={'user_id': self.user.pk})
+        second = CreateOrderSerializer(data={'cart_id': str(cart.pk)}, context={'user_id': self.user.pk})
+        first.is_valid(raise_exception=True)
+        second.is_valid(raise_exception=True)
+        first.save()
+        with self.assertRaises(ValidationError):
+            second.save()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 3)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_cart_with_a_negative_quantity_is_rejected(self):
+        other = make_book(self.book.category, title='Other', slug='other')
+        cart = make_cart((self.book, -3), (other, 5))
+        serializer = CreateOrderSerializer(data={'cart_id': str(cart.pk)}, context={'user_id': self.user.pk})
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors['items'], [{'book_id': str(self.book.pk), 'quantity': '-3'}])
+
+    def test_cart_items_need_a_positive_quantity(self):
+        client = APIClient()
+        cart = Cart.objects.create()
+        response = client.post(f'/store/carts/{cart.pk}/items/', {'book_id': self.book.pk, 'quantity': -3}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('quantity', response.json())
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_cart_with_negative_units_is_a_client_error(self):
+        # Order.item_count is unsigned, so saving such an order would fail in the database.
+        client = APIClient()
+        client.force_authenticate(self.user)
+        cart = make_cart((self.book, -3))
+        response = client.post('/store/orders/', {'cart_id': str(cart.pk)}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_book_deleted_after_validation_is_a_conflict(self):
+        cart = make_cart((self.book, 2))
+        serializer = CreateOrderSerializer(data={'cart_id': str(cart.pk)}, context={'user_id': self.user.pk})
+        serializer.is_valid(raise_exception=True)
+        book_id = self.book.pk
+        self.book.delete()
+        with self.assertRaises(InsufficientInventory) as raised:
+            serializer.save()
+        self.assertEqual(raised.exception.detail['conflicts'], [{'book_id': book_id, 'requested': 2, 'available': 0}])
+        self.assertFalse(Order.objects.exists())
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentCheckoutTests(TransactionTestCase):
+    def test_parallel_checkouts_do_not_oversell(self):
+        book = make_book(Category.objects.create(title='Novels'), inventory=3)
+        buyers = [(make_user(index), make_cart((book, 1))) for index in range(6)]
+        barrier = threading.Barrier(len(buyers))
+        outcomes = []
+
+        def buy(user, cart):
+            try:
+                barrier.wait()
+                checkout(user, cart)
+                outcomes.append('ordered')
+            except InsufficientInventory:
+                outcomes.append('conflict')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=buyer) for buyer in buyers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(outcomes), ['conflict'] * 3 + ['ordered'] * 3)
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 0)
+        self.assertEqual(Order.objects.count(), 3)
+
+
+class CartTotalTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(make_user())
+        self.book = make_book(Category.objects.create(title='Novels'), price='10.10')
+        self.cart = make_cart((self.book, 4))
+
+    def test_totals_have_two_decimal_places(self):
+        response = self.client.get(f'/store/carts/{self.cart.pk}/')
+        self.assertEqual(response.content.count(b'"total_price":40.40}'), 2)
+
+    def test_lines_show_the_price_their_total_uses(self):
+        Book.objects.filter(pk=self.book.pk).update(effective_price='8.00')
+        line = self.client.get(f'/store/carts/{self.cart.pk}/').json()['items'][0]
+        self.assertEqual(line['book']['effective_price'], 8.0)
+        self.assertEqual(line['total_price'], 32.0)
+
+    def test_totals_without_annotations(self):
+        item = CartItem.objects.get(cart=self.cart)
+        self.assertEqual(CartSerializer(self.cart).data['total_price'], Decimal('40.40'))
+        self.assertEqual(CartItemSerializer(item).data['total_price'], Decimal('40.40'))
+
+
+@skipUnless(connection.vendor == 'mysql', 'EXPLAIN output is only checked on MySQL.')
+class BookIndexTests(TransactionTestCase):
+    # The filter/ordering combinations of the book list, as BookFilter and the ordering filter build them.
+    combinations = [
+        ({'category_id': 1, 'price__gt': 20, 'price__lt': 40}, None),
+        ({'category_id': 1, 'effective_price__gt': 20, 'effective_price__lt': 40}, None),
+        ({'category_id': 1, 'price__gt': 20}, 'price'),
+        ({'inventory__lt': 5}, None),
+        ({'inventory__gt': 990}, None),
+        ({}, 'price'),
+        ({}, '-price'),
+        ({}, 'date_time_modified'),
+        ({}, '-date_time_modified'),
+        ({'category_id': 1}, 'price'),
+        ({'category_id': 1}, '-price'),
+        ({'category_id': 1}, 'date_time_modified'),
+        ({'category_id': 1}, '-date_time_modified'),
+    ]
+
+    def setUp(self):
+        categories = [Category.objects.create(pk=index + 1, title=f'Category {index}') for index in range(20)]
+        Book.objects.bulk_create(
+            Book(
+                title=f'Book {index}', slug=f'book-{index}', description='A book',
+                price=5 + index % 95, effective_price=5 + index % 95,
+                inventory=index % 1000, category=categories[index % len(categories)],
+            )
+            for index in range(4000)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE TABLE {Book._meta.db_table}')
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}', params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def test_book_list_queries_use_an_index(self):
+        for filters, ordering in self.combinations:
+            with self.subTest(filters=filters, ordering=ordering):
+                filterset = BookFilter(filters, queryset=Book.objects.all())
+                self.assertTrue(filterset.is_valid(), filterset.errors)
+                queryset = filterset.qs
+                if ordering:
+                    # The id tiebreaker follows the direction of the ordering, as in KeysetPagination.
+                    queryset = queryset.order_by(ordering, '-id' if ordering.startswith('-') else 'id')
+                plan = self.explain(queryset[:10])
+                scans = [row for row in plan if row['table'] == Book._meta.db_table and row['type'] == 'ALL']
+                self.assertEqual(scans, [], plan)
+
+
+def make_upload(color='red'):
+    buffer = BytesIO()
+    Image.new('RGB', (4, 4), color).save(buffer, format='PNG')
+    return SimpleUploadedFile('cover.png', buffer.getvalue(), content_type='image/png')
+
+
+@patch('store.signals.signal_handlers.schedule_variants')
+class ImageBlobTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.book = make_book(Category.objects.create(title='Novels'))
+
+    def upload(self):
+        with transaction.atomic():
+            return BookImage.objects.create(book=self.book, image=make_upload())
+
+    def test_shared_blob_is_deleted_with_its_last_row(self, schedule_variants):
+        first, second = self.upload(), self.upload()
+        path = first.image.path
+        self.assertEqual(first.image.name, second.image.name)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(ImageBlob.objects.exists())
+
+    def test_upload_after_release_writes_the_blob_again(self, schedule_variants):
+        first = self.upload()
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        second = self.upload()
+        self.assertTrue(os.path.exists(second.image.path))
+        self.assertTrue(ImageBlob.objects.filter(name=second.image.name).exists())
+
+
+class FastSerializerParityTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(title='Novels')
+        self.book = make_book(category, title='Silver Harbor', price='12.50')
+        self.bare_book = make_book(category, title='No Images', slug='no-images', description='')
+        BookImage.objects.create(book=self.book, image='store/images/cover.png', variants_ready=True)
+        BookImage.objects.create(book=self.book, image=None)
+        user = make_user()
+        self.customer = Customer.objects.get(user=user)
+        Address.objects.create(customer=self.customer, province='P', city='C', street='S', detail='D')
+        make_user(1)
+        order = Order.objects.create(customer=self.customer, total_amount='25.00', item_count=2)
+        OrderItem.objects.create(order=order, book=self.book, quantity=2, unit_price='12.50')
+        Order.objects.create(customer=self.customer)
+        make_cart((self.book, 3), (self.bare_book, 1))
+        Cart.objects.create()
+
+    def assertSameBytes(self, serializer_class, instance, many=True, query=None):
+        request = Request(APIRequestFactory().get('/', query or {}))
+        renderer = FastJSONRenderer()
+        drf = serializer_class(instance, many=many, context={'request': request})
+        fast = FastSerializer(serializer_class(instance, many=many, context={'request': request}))
+        self.assertEqual(renderer.render(fast.data), renderer.render(drf.data))
+
+    def test_books(self):
+        books = Book.objects.prefetch_related('images').select_related('category').order_by('pk')
+        self.assertSameBytes(BookSerializer, books)
+        self.assertSameBytes(BookSerializer, books, query={'fields': 'id,title,images,category'})
+        self.assertSameBytes(BookSerializer, books, query={'omit': 'images,description'})
+        self.assertSameBytes(BookSerializer, books.first(), many=False)
+
+    def test_simple_books(self):
+        self.assertSameBytes(SimpleBookSerializer, Book.objects.order_by('pk'))
+
+    def test_orders(self):
+        self.assertSameBytes(OrderSerializer, Order.objects.prefetch_related('orderitems__book').order_by('pk'))
+
+    def test_carts(self):
+        self.assertSameBytes(CartSerializer, Cart.objects.with_totals().prefetch_related('items').order_by('created_at'))
+        self.assertSameBytes(CartSerializer, Cart.objects.prefetch_related('items__book').order_by('created_at'))
+        self.assertSameBytes(CartItemSerializer, CartItem.objects.with_totals().order_by('pk'))
+
+    def test_customers_with_and_without_address(self):
+        self.assertSameBytes(CustomerSerializer, Customer.objects.select_related('address').order_by('pk'))
+
+
+class BulkCreateTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(username='admin', email='admin@example.com', is_staff=True))
+        self.category = Category.objects.create(title='Novels')
+        make_book(self.category, title='Existing')
+
+    def post_rows(self):
+        rows = [
+            {'title': f'Book {index}', 'slug': f'book-{index}', 'description': 'A book', 'price': '10.00', 'inventory': 1, 'category': self.category.pk}
+            for index in range(3)
+        ]
+        return self.client.post('/store/books/bulk/', rows, format='json')
+
+    def assertCreatedRows(self, response):
+        self.assertEqual(response.status_code, 201)
+        created = response.json()['created']
+        self.assertEqual(dict(Book.objects.filter(pk__in=created).values_list('pk', 'title')), {
+            pk: f'Book {index}' for index, pk in enumerate(created)
+        })
+        self.assertEqual(BookSearchTerm.objects.filter(book__in=created).values('book').distinct().count(), 3)
+
+    def test_ids_come_back_for_every_row(self):
+        self.assertCreatedRows(self.post_rows())
+
+    def test_ids_come_back_without_returning(self):
+        features = type(connection.features)
+        with patch.object(features, 'can_return_rows_from_bulk_insert', new_callable=PropertyMock, return_value=False):
+            self.assertCreatedRows(self.post_rows())
+
+    @skipUnless(connection.vendor == 'mysql', 'auto_increment_increment is a MySQL setting.')
+    def test_ids_follow_the_auto_increment_step(self):
+        # MySQL has no RETURNING, so this runs the LAST_INSERT_ID() path for real.
+        def set_step(step):
+            with connection.cursor() as cursor:
+                cursor.execute('SET SESSION auto_increment_increment = %s', [step])
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT @@SESSION.auto_increment_increment')
+            self.addCleanup(set_step, cursor.fetchone()[0])
+        set_step(3)
+        response = self.post_rows()
+        self.assertCreatedRows(response)
+        created = response.json()['created']
+        self.assertEqual([b - a for a, b in zip(created, created[1:])], [3, 3])
+
+
+class RebuildCountsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(title='Novels')
+        make_book(self.category)
+
+    def test_rebuilt_comment_counts_touch_the_books(self):
+        book = Book.objects.get()
+        Book.objects.filter(pk=book.pk).update(approved_comment_count=4)
+        before = Book.objects.get().date_time_modified
+        self.client.get(f'/store/books/{book.pk}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rebuild_comment_counts', stdout=StringIO())
+        self.assertGreater(Book.objects.get().date_time_modified, before)
+        self.assertEqual(self.client.get(f'/store/books/{book.pk}/').json()['approved_comment_count'], 0)
+
+    def test_rebuilt_category_counts_reach_cached_lists(self):
+        Category.objects.update(books_count=5)
+        self.client.get('/store/categories/')
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rebuild_category_counts', stdout=StringIO())
+        response = self.client.get('/store/categories/')
+        self.assertEqual([row['books_count'] for row in response.json()['results']], [1])
+
+
+class MediaCacheControlTests(SimpleTestCase):
+    def test_only_content_hashed_originals_are_immutable(self):
+        original = 'store/images/ab/' + 'ab' * 32 + '.png'
+        self.assertEqual(get_cache_control(original), IMMUTABLE_CACHE_CONTROL)
+        self.assertNotEqual(get_cache_control(original.replace('.png', '.thumbnail.png')), IMMUTABLE_CACHE_CONTROL)
+        self.assertNotEqual(get_cache_control('store/images/cover.png'), IMMUTABLE_CACHE_CONTROL)
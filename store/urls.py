@@ -1,3 +1,4 @@
+from django.urls import path
 from rest_framework_nested import routers
 
 from . import views
@@ -9,6 +10,7 @@ router.register('discounts', views.DiscountViewSet, basename='discounts')
 router.register('customers', views.CustomerViewSet, basename='customers')
 router.register('carts', views.CartViewSet, basename='carts')
 router.register('orders', views.OrderViewSet, basename='orders')
+router.register('comments', views.CommentModerationViewSet, basename='comments')
 
 
 
@@ -22,4 +24,8 @@ customer_router.register('address', views.AddressViewSet, basename='customer_add
 cart_router = routers.NestedDefaultRouter(router, 'carts', lookup='cart')
 cart_router.register('items', views.CartItemViewSet, basename='cart-items')
 
-urlpatterns = router.urls + book_router.urls + customer_router.urls + cart_router.urls
\ No newline at end of file
+urlpatterns = [
+    path('cache-stats/', views.CacheStatsView.as_view(), name='cache-stats'),
+]
+
+urlpatterns += router.urls + book_router.urls + customer_router.urls + cart_router.urls
\ No newline at end of file
@@ -7,26 +7,44 @@ from rest_framework.decorators import action, permission_classes
 from .models import *
 from . import serializers
 from .serializers import CustomerSerializer, AddressSerializer
-from .pagination import DefaultPagination
+from .pagination import DefaultPagination, KeysetPagination, PageOrCursorPagination
 from rest_framework.mixins import RetrieveModelMixin,CreateModelMixin,DestroyModelMixin,ListModelMixin
 from rest_framework.permissions import IsAuthenticated,IsAdminUser,IsAuthenticatedOrReadOnly
-from django.db.models import Prefetch
+from django.db.models import Count, Max, Prefetch, Sum
 from .permissions import IsAdminOrReadOnly, IsSelfOrAdmin
 from django_filters.rest_framework import DjangoFilterBackend
-from .filters import BookFilter
+from .filters import BookFilter, BookSearchFilter, CommentFilter, OrderFilter
 from rest_framework.exceptions import MethodNotAllowed, PermissionDenied
-
-
-class BookViewSet(ModelViewSet):
-    queryset = Book.objects.select_related('category').prefetch_related('images').all()
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+from rest_framework.views import APIView
+from .cache import CachedResponseMixin, get_stats
+from .conditional import ConditionalGetMixin
+from .fast_serializers import FastReadMixin
+from .renderers import StreamingListMixin
+
+
+class BookViewSet(ConditionalGetMixin, CachedResponseMixin, FastReadMixin, ModelViewSet):
+    cache_namespace = 'books'
+    # Columns that are only loaded when the client renders them.
+    deferrable_fields = ['title', 'slug', 'description']
+    filter_backends = [DjangoFilterBackend, BookSearchFilter, OrderingFilter]
     filterset_class = BookFilter
-    search_fields = ['title',]
-    ordering_fields = ['price', 'date_time_modified']
+    ordering_fields = ['price', 'effective_price', 'date_time_modified', 'approved_comment_count']
     serializer_class = serializers.BookSerializer
     permission_classes = [IsAdminOrReadOnly]
     
     
+    def get_queryset(self):
+        queryset = Book.objects.all()
+        fields = serializers.get_requested_fields(self.request, self.serializer_class.Meta.fields)
+        if 'category' in fields:
+            queryset = queryset.select_related('category')
+        if 'images' in fields:
+            queryset = queryset.prefetch_related('images')
+        deferred = [name for name in self.deferrable_fields if name not in fields]
+        if deferred:
+            queryset = queryset.defer(*deferred)
+        return queryset
+
     def get_serializer_context(self):
         return {'request': self.request}
     
@@ -36,7 +54,23 @@ class BookViewSet(ModelViewSet):
             return Response({'error': 'Product cannot be deleted because it is associated with an order item.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
         return super().destroy(request, *args, **kwargs)
     
-    pagination_class = DefaultPagination
+    pagination_class = PageOrCursorPagination
+
+    @action(detail=False, methods=['post', 'patch', 'delete'])
+    def bulk(self, request):
+        rows = serializers.get_bulk_rows(request.data)
+        if request.method == 'POST':
+            key, write, success_status = 'created', serializers.bulk_create_books, status.HTTP_201_CREATED
+        elif request.method == 'PATCH':
+            key, write, success_status = 'updated', serializers.bulk_update_books, status.HTTP_200_OK
+        else:
+            key, write, success_status = 'deleted', serializers.bulk_delete_books, status.HTTP_200_OK
+        ids, errors = write(rows)
+        errors.sort(key=lambda error: error['index'])
+        return Response(
+            {key: ids, 'errors': errors},
+            status=success_status if ids or not errors else status.HTTP_400_BAD_REQUEST,
+        )
 
 class BookImageViewSet(ModelViewSet):
     permission_classes = [IsAdminOrReadOnly]
@@ -50,35 +84,77 @@ class BookImageViewSet(ModelViewSet):
     
 
 class CommentViewSet(ModelViewSet):
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = CommentFilter
+
     def get_queryset(self):
-        return Comment.objects.select_related('book').filter(book_id = self.kwargs['book_pk'])
+        queryset = Comment.objects.filter(book_id = self.kwargs['book_pk'])
+        # Only staff can see comments that are waiting for or failed moderation.
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(status=Comment.COMMENT_STATUS_APPROVED)
+        return queryset.order_by('-date_was_sent', '-id')
     
     serializer_class = serializers.CommentSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
-    pagination_class = DefaultPagination
+    pagination_class = PageOrCursorPagination
     
     def get_serializer_context(self):
         return {'book_id': self.kwargs['book_pk']}
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def moderate(self, request, book_pk=None):
+        return moderate_comments(request, Comment.objects.filter(book_id=book_pk))
+
+
+class CommentModerationViewSet(ListModelMixin, GenericViewSet):
+    permission_classes = [IsAdminUser]
+    serializer_class = serializers.CommentSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        # The moderation queue: oldest waiting comments first unless ?status= asks otherwise.
+        comment_status = self.request.query_params.get('status', Comment.COMMENT_STATUS_WAITING)
+        return Comment.objects.filter(status=comment_status).order_by('date_was_sent', 'id')
+
+    @action(detail=False, methods=['post'])
+    def moderate(self, request):
+        return moderate_comments(request, Comment.objects.all())
+
+
+def moderate_comments(request, comments):
+    serializer = serializers.ModerateCommentsSerializer(data=request.data, context={'comments': comments})
+    serializer.is_valid(raise_exception=True)
+    updated = serializer.save()
+    return Response({'requested': len(set(serializer.validated_data['ids'])), 'updated': updated})
     
 
 
-class CategoryViewSet(ModelViewSet):
+class CategoryViewSet(CachedResponseMixin, ModelViewSet):
+    cache_namespace = 'categories'
     permission_classes = [IsAdminOrReadOnly]
     def get_queryset(self):
-        return Category.objects.prefetch_related('books').all()
+        return Category.objects.all()
     
     serializer_class = serializers.CategorySerializer
 
     pagination_class = DefaultPagination
 
     def destroy(self, request, *args, **kwargs):
-        if Category.objects.values('books').count() > 0 :
+        if Book.objects.filter(category_id=self.kwargs['pk']).exists():
             return Response({'error':'this category has one or more book in it.delete books first!'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
         return super().destroy(request, *args, **kwargs)
 
+    @action(detail=True, methods=['post'])
+    def reassign(self, request, pk):
+        category = self.get_object()
+        serializer = serializers.ReassignCategorySerializer(data=request.data, context={'category_id': category.id})
+        serializer.is_valid(raise_exception=True)
+        moved_books = serializer.save()
+        return Response({'moved_books': moved_books, 'target_category_id': serializer.validated_data['target_category_id']})
+
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 
-class CustomerViewSet(ModelViewSet):
+class CustomerViewSet(StreamingListMixin, FastReadMixin, ModelViewSet):
     serializer_class = CustomerSerializer
 
     def get_queryset(self):
@@ -144,20 +220,30 @@ class AddressViewSet(ModelViewSet):
     
 
 
-class DiscountViewSet(ModelViewSet):
+class DiscountViewSet(CachedResponseMixin, ModelViewSet):
+    cache_namespace = 'discounts'
     permission_classes = [IsAdminOrReadOnly]
     queryset = Discount.objects.prefetch_related('books').all()
     serializer_class = serializers.DiscountSerializer
     pagination_class  = DefaultPagination
 
 
+class CacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_stats())
+
+
 class CartItemViewSet(ModelViewSet):
     http_method_names = ['get','patch','post', 'delete']
 
     def get_queryset(self):
-        return CartItem.objects.select_related('book').filter(cart_id=self.kwargs['cart_pk'])
+        return CartItem.objects.with_totals().filter(cart_id=self.kwargs['cart_pk'])
     
     def get_serializer_class(self):
+        if self.action == 'batch':
+            return serializers.BatchCreateCartItemSerializer
         if self.request.method == 'POST':
             return serializers.CreateCartItemSerializer
         elif self.request.method == 'PATCH':
@@ -166,20 +252,43 @@ class CartItemViewSet(ModelViewSet):
     
     def get_serializer_context(self):
         return {'cart_id': self.kwargs['cart_pk']}
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        Cart.objects.filter(pk=self.kwargs['cart_pk']).touch()
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        Cart.objects.filter(pk=self.kwargs['cart_pk']).touch()
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request, cart_pk=None):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.save()
+        serializer = serializers.CartItemSerializer(items, many=True)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
     
 
-class CartViewSet(GenericViewSet,
+class CartViewSet(FastReadMixin,
+                  GenericViewSet,
                   CreateModelMixin,
                   DestroyModelMixin,
                   RetrieveModelMixin):
     permission_classes = [IsAuthenticated]
-    queryset = Cart.objects.prefetch_related('items__book').all()
+    queryset = Cart.objects.with_totals().prefetch_related(
+        Prefetch('items', queryset=CartItem.objects.with_totals())
+    )
     serializer_class = serializers.CartSerializer
 
 
 
-class OrderViewSet(ModelViewSet):
+class OrderViewSet(FastReadMixin, ModelViewSet):
     http_method_names = ['get', 'post', 'patch', 'delete', 'head', 'options']
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = OrderFilter
+    pagination_class = KeysetPagination
+    keyset_ordering = ['-placed_at']
 
     def get_queryset(self):
         queryset = Order.objects.prefetch_related(
@@ -208,8 +317,28 @@ class OrderViewSet(ModelViewSet):
         serializer = serializers.CreateOrderSerializer(data=request.data, context={'user_id': self.request.user.id})
         serializer.is_valid(raise_exception=True)
         order = serializer.save()
-        serializer = serializers.OrderSerializer(order)
+        serializer = serializers.OrderSerializer(self.get_queryset().get(pk=order.pk))
         return Response(serializer.data)
     
     def destroy(self, request, *args, **kwargs):
         return Response({'eror':'Orders can not be Deleted!'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    @action(detail=False)
+    def summary(self, request):
+        queryset = Order.objects.all()
+        if not request.user.is_staff:
+            queryset = queryset.filter(customer__user_id=request.user.id)
+
+        summary = (
+            self.filter_queryset(queryset)
+            .values('customer_id')
+            .annotate(
+                order_count=Count('id'),
+                item_count=Sum('item_count'),
+                revenue=Sum('total_amount'),
+                last_order_at=Max('placed_at'),
+            )
+            .order_by('customer_id')
+        )
+        serializer = serializers.OrderSummarySerializer(summary, many=True)
+        return Response(serializer.data)